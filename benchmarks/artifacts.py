@@ -0,0 +1,77 @@
+import argparse
+import ast
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from common.artifacts import writeParquet, readParquet
+from etl.parsing import TAG_COLUMNS
+from etl.transform import createMoviesDatabase, createAnalyticsMoviesDatabase
+
+
+def timeRead(readFunction, repeat: int):
+    startTime = time.perf_counter()
+    for _ in range(repeat):
+        df = readFunction()
+
+    return (time.perf_counter() - startTime) / repeat, df
+
+
+def readCsv(path: str, listColumns: list):
+    df = pd.read_csv(path, index_col=0)
+
+    # csv stores lists as their repr, they must be parsed back to match the parquet dtypes
+    for column in listColumns:
+        df[column] = df[column].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else None)
+
+    return df
+
+
+def benchmarkArtifact(
+    name: str, df: pd.DataFrame, projectedColumns: list, folder: str, repeat: int, listColumns: list = []
+):
+    csvPath = os.path.join(folder, f'{name}.csv')
+    parquetPath = os.path.join(folder, f'{name}.parquet')
+
+    df.to_csv(csvPath)
+    writeParquet(df=df, path=parquetPath)
+
+    csvTime, _ = timeRead(lambda: readCsv(path=csvPath, listColumns=listColumns), repeat=repeat)
+    parquetTime, parquetDf = timeRead(lambda: readParquet(source=parquetPath), repeat=repeat)
+    projectedTime, _ = timeRead(lambda: readParquet(source=parquetPath, columns=projectedColumns), repeat=repeat)
+
+    assert parquetDf.equals(df.reset_index(drop=True)), f'{name} changed in the parquet round trip'
+
+    csvSize = os.path.getsize(csvPath) / 2**20
+    parquetSize = os.path.getsize(parquetPath) / 2**20
+
+    print(f'{name} ({len(df):,} rows)')
+    print(f'  csv: {csvSize:,.2f} MiB, {csvTime * 1000:,.1f} ms')
+    print(f'  parquet: {parquetSize:,.2f} MiB ({csvSize / parquetSize:.1f}x smaller), {parquetTime * 1000:,.1f} ms ({csvTime / parquetTime:.1f}x)')
+    print(f'  parquet {projectedColumns}: {projectedTime * 1000:,.1f} ms ({csvTime / projectedTime:.1f}x)')
+
+
+def runArtifactsBenchmark(repeat: int = 5):
+    movieDb = createMoviesDatabase()
+    movieDbAnalytics = createAnalyticsMoviesDatabase(movieDb=movieDb)
+
+    with tempfile.TemporaryDirectory() as folder:
+        benchmarkArtifact(name='movieDb', df=movieDb, projectedColumns=['id', 'title'], folder=folder, repeat=repeat)
+        benchmarkArtifact(
+            name='movieDbAnalytics',
+            df=movieDbAnalytics,
+            projectedColumns=['id', 'tags'],
+            folder=folder,
+            repeat=repeat,
+            listColumns=TAG_COLUMNS,
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare CSV and Parquet movie artifacts size and load time.')
+    parser.add_argument('--repeat', type=int, default=5, help='Reads averaged per measurement.')
+    args = parser.parse_args()
+
+    runArtifactsBenchmark(repeat=args.repeat)
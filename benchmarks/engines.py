@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common.engines import ExactEngine, IvfEngine
+from etl.similarity import createMovieDbTagVectors, createIvfIndex
+from etl.transform import createMoviesDatabase, createAnalyticsMoviesDatabase
+
+
+def createSyntheticMovieDb(nMovies: int, nTerms: int = 20000, nTags: int = 30, seed: int = 0):
+    rng = np.random.default_rng(seed)
+
+    # zipf-like term popularity, close to how genres, cast and keywords repeat across films
+    termProbabilities = 1 / np.arange(1, nTerms + 1)
+    termProbabilities /= termProbabilities.sum()
+    tagTerms = rng.choice(nTerms, size=(nMovies, nTags), p=termProbabilities)
+
+    movieDb = pd.DataFrame({'tags': [' '.join(f'term{term}' for term in terms) for terms in tagTerms]})
+
+    return movieDb
+
+
+def measureEngine(engine, queryVectors, queryRows: np.ndarray, n: int):
+    startTime = time.perf_counter()
+    resultIndexes, _ = engine.search(queryVectors=queryVectors, n=n, excludeRows=queryRows)
+    latency = (time.perf_counter() - startTime) / len(queryRows)
+
+    return resultIndexes, latency
+
+
+def runEnginesBenchmark(nMovies: int = None, nQueries: int = 500, n: int = 10, probesList: list = [1, 2, 4, 8, 16, 32]):
+    if nMovies is None:
+        movieDb = createAnalyticsMoviesDatabase(movieDb=createMoviesDatabase())
+    else:
+        movieDb = createSyntheticMovieDb(nMovies=nMovies)
+
+    _, vectors = createMovieDbTagVectors(movieDb=movieDb, maxFeatures=None)
+    ivfIndex = createIvfIndex(vectors=vectors)
+
+    queryRows = np.random.default_rng(1).choice(vectors.shape[0], size=min(nQueries, vectors.shape[0]), replace=False)
+    queryVectors = vectors[queryRows]
+
+    # one query at a time, like the recommendation page
+    exactEngine = ExactEngine(vectors=vectors, blockSize=1)
+    exactIndexes, exactLatency = measureEngine(engine=exactEngine, queryVectors=queryVectors, queryRows=queryRows, n=n)
+
+    print(f'{vectors.shape[0]:,} movies, {len(queryRows):,} queries, recall@{n}')
+    print(f'exact: recall 1.000, {exactLatency * 1000:.2f} ms/query')
+
+    for nProbes in probesList:
+        ivfEngine = IvfEngine(
+            vectors=vectors,
+            centroids=ivfIndex['centroids'],
+            assignments=ivfIndex['assignments'],
+            nProbes=nProbes,
+            blockSize=1,
+        )
+        ivfIndexes, ivfLatency = measureEngine(engine=ivfEngine, queryVectors=queryVectors, queryRows=queryRows, n=n)
+
+        recall = np.mean([len(np.intersect1d(ivf, exact)) / n for ivf, exact in zip(ivfIndexes, exactIndexes)])
+        print(f'ivf {nProbes:>3} probes: recall {recall:.3f}, {ivfLatency * 1000:.2f} ms/query')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recall@K against latency for the movie similarity engines.')
+    parser.add_argument('--movies', type=int, default=None, help='Synthetic catalog size, defaults to the real catalog.')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    runEnginesBenchmark(nMovies=args.movies, nQueries=args.queries, n=args.k)
@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common.features import CALENDAR_FEATURES, createCalendarFeatures
+
+
+######## BASELINE (one DatetimeIndex accessor per feature) ########
+def createCalendarFeaturesBaseline(datetimeIndex: pd.DatetimeIndex):
+    featuresDf = pd.DataFrame(index=datetimeIndex)
+
+    featuresDf['hour'] = datetimeIndex.hour
+    featuresDf['day'] = datetimeIndex.day
+    featuresDf['month'] = datetimeIndex.month
+    featuresDf['year'] = datetimeIndex.year
+    featuresDf['quarter'] = datetimeIndex.quarter
+    featuresDf['dayofyear'] = datetimeIndex.dayofyear
+
+    return featuresDf
+
+
+######## BENCHMARK ########
+def timeFunction(function, repeat: int):
+    startTime = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+
+    return (time.perf_counter() - startTime) / repeat, result
+
+
+def runFeaturesBenchmark(nHours: int = 1000000, repeat: int = 5):
+    datetimeIndex = pd.date_range(start='2002-01-01', periods=nHours, freq='H')
+
+    baselineTime, baselineDf = timeFunction(lambda: createCalendarFeaturesBaseline(datetimeIndex=datetimeIndex), repeat=repeat)
+    featuresTime, featuresDf = timeFunction(
+        lambda: createCalendarFeatures(datetimes=datetimeIndex, index=datetimeIndex), repeat=repeat
+    )
+
+    assert np.array_equal(baselineDf.to_numpy(), featuresDf.to_numpy()), 'Calendar features differ from the baseline'
+
+    baselineMemory = baselineDf.memory_usage(index=False).sum() / 2**20
+    featuresMemory = featuresDf.memory_usage(index=False).sum() / 2**20
+
+    print(f'{nHours:,} hourly timestamps, {len(CALENDAR_FEATURES)} features')
+    print(f'baseline (DatetimeIndex accessors): {baselineTime * 1000:,.1f} ms, {baselineMemory:,.1f} MiB')
+    print(
+        f'vectorized (int64 timestamps): {featuresTime * 1000:,.1f} ms ({baselineTime / featuresTime:.1f}x), '
+        f'{featuresMemory:,.1f} MiB ({baselineMemory / featuresMemory:.1f}x smaller)'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare calendar feature engineering paths.')
+    parser.add_argument('--hours', type=int, default=1000000, help='Number of hourly timestamps.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs averaged per measurement.')
+    args = parser.parse_args()
+
+    runFeaturesBenchmark(nHours=args.hours, repeat=args.repeat)
@@ -0,0 +1,96 @@
+import argparse
+import ast
+import time
+
+import pandas as pd
+
+from etl.parsing import (
+    MOVIE_CARD_CAST_SIZE,
+    TAG_COLUMNS,
+    getDirectorFromStrListObj,
+    getNamesFromStrListObj,
+    parseMovieDbTagColumns,
+)
+from etl.transform import createMoviesDatabase
+
+
+######## BASELINE (row by row literal_eval through DataFrame.apply) ########
+def extractAttributeBaseline(obj: str, attrName: str, limit: int = None):
+    if not isinstance(obj, str):
+        return
+
+    returnList = []
+
+    for idx, objItem in enumerate(ast.literal_eval(obj)):
+        if attrName not in objItem:
+            continue
+
+        if isinstance(limit, int) and not limit > idx:
+            break
+
+        returnList.append(str(objItem[attrName]).replace(" ", "").lower())
+
+    return returnList
+
+
+def getMainCrewMembersBaseline(obj: str, jobs: list = ['Writer', 'Director']):
+    if not isinstance(obj, str):
+        return
+
+    returnList = []
+
+    for objItem in ast.literal_eval(obj):
+        if len(returnList) == len(jobs):
+            break
+
+        if objItem['job'] not in jobs:
+            continue
+
+        returnList.append(objItem['name'].replace(" ", "").lower())
+
+    return returnList
+
+
+def parseMovieDbTagColumnsBaseline(movieDb: pd.DataFrame):
+    parsedDf = pd.DataFrame(index=movieDb.index)
+
+    parsedDf['genres'] = movieDb['genres'].apply(lambda x: extractAttributeBaseline(obj=x, attrName='name'))
+    parsedDf['keywords'] = movieDb['keywords'].apply(lambda x: extractAttributeBaseline(obj=x, attrName='name'))
+    parsedDf['cast'] = movieDb['cast'].apply(lambda x: extractAttributeBaseline(obj=x, attrName='name', limit=5))
+    parsedDf['crew'] = movieDb['crew'].apply(lambda x: getMainCrewMembersBaseline(obj=x))
+
+    # movie cards and the filter index used to decode the payloads again on their own
+    parsedDf['director'] = movieDb['crew'].apply(lambda x: getDirectorFromStrListObj(obj=x))
+    parsedDf['cardCast'] = movieDb['cast'].apply(lambda x: getNamesFromStrListObj(obj=x, limit=MOVIE_CARD_CAST_SIZE))
+    parsedDf['genreNames'] = movieDb['genres'].apply(lambda x: getNamesFromStrListObj(obj=x))
+
+    return parsedDf
+
+
+######## BENCHMARK ########
+def runParsingBenchmark(repeat: int = 1, nWorkers: int = None):
+    movieDb = createMoviesDatabase()[TAG_COLUMNS]
+    movieDb = pd.concat([movieDb] * repeat, ignore_index=True)
+
+    startTime = time.perf_counter()
+    baselineDf = parseMovieDbTagColumnsBaseline(movieDb=movieDb)
+    baselineTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDb, nWorkers=nWorkers)
+    parsedTime = time.perf_counter() - startTime
+
+    assert baselineDf.equals(parsedDf), 'Parsed columns differ from the baseline output'
+
+    print(f'{len(movieDb):,} movies')
+    print(f'baseline (apply + literal_eval, one pass per field): {baselineTime:.2f}s')
+    print(f'parallel (json + process pool, single pass): {parsedTime:.2f}s ({baselineTime / parsedTime:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare TMDB tag columns parsing paths.')
+    parser.add_argument('--repeat', type=int, default=1, help='Replicate the catalog to benchmark larger inputs.')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size, defaults to all cores.')
+    args = parser.parse_args()
+
+    runParsingBenchmark(repeat=args.repeat, nWorkers=args.workers)
@@ -0,0 +1,25 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = 'zstd'
+
+
+def writeParquet(df: pd.DataFrame, path: str):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path, compression=PARQUET_COMPRESSION)
+
+    return
+
+
+def readParquet(source, columns: list = None):
+    # only the requested column chunks are decoded
+    table = pq.read_table(source, columns=columns)
+    df = table.to_pandas()
+
+    # list columns come back as numpy arrays, keep them as plain lists like the ETL produced them
+    for field in table.schema:
+        if pa.types.is_list(field.type):
+            df[field.name] = [None if values is None else values.tolist() for values in df[field.name]]
+
+    return df
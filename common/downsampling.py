@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+CHART_POINT_BUDGET = 2000
+
+
+def getLttbIndexes(x: np.ndarray, y: np.ndarray, nPoints: int):
+    nRows = len(x)
+
+    if nPoints >= nRows or nPoints < 3:
+        return np.arange(nRows)
+
+    # first and last points are kept, the rows between them split into nPoints - 2 buckets
+    edges = np.linspace(1, nRows - 1, nPoints - 1).astype(np.int64)
+    bucketSizes = np.diff(np.append(edges, nRows))
+    bucketMeansX = np.add.reduceat(x, edges) / bucketSizes
+    bucketMeansY = np.add.reduceat(y, edges) / bucketSizes
+
+    indexes = np.empty(nPoints, dtype=np.int64)
+    indexes[0] = 0
+    indexes[-1] = nRows - 1
+
+    selected = 0
+    for bucket in range(nPoints - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+
+        # keep the point forming the largest triangle with the last kept point and the next bucket average
+        areas = np.abs(
+            (x[selected] - bucketMeansX[bucket + 1]) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (bucketMeansY[bucket + 1] - y[selected])
+        )
+        selected = start + np.argmax(areas)
+        indexes[bucket + 1] = selected
+
+    return indexes
+
+
+def downsampleSeries(series: pd.Series, nPoints: int = CHART_POINT_BUDGET, dateRange: tuple = None):
+    # series are sorted by time, so the zoomed range is a positional slice
+    if dateRange is not None:
+        start, stop = series.index.searchsorted(dateRange[0]), series.index.searchsorted(dateRange[1], side='right')
+        series = series.iloc[start:stop]
+
+    x = series.index.to_numpy(dtype='datetime64[ns]').view(np.int64).astype(np.float64)
+    y = series.to_numpy(dtype=np.float64)
+
+    return series.iloc[getLttbIndexes(x=x, y=y, nPoints=nPoints)]
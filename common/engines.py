@@ -0,0 +1,181 @@
+import numpy as np
+import scipy.sparse as sp
+
+from common.recommender import selectTopN
+
+MOVIE_ENGINES = ['exact', 'ivf']
+IVF_PROBES = 8
+
+
+def toDenseArray(matrix):
+    if sp.issparse(matrix):
+        return matrix.toarray()
+
+    return np.asarray(matrix)
+
+
+class ExactEngine:
+    def __init__(self, vectors, blockSize: int = 256) -> None:
+        self.vectors = vectors
+        self.vectorsT = vectors.T.tocsr()
+        self.blockSize = blockSize
+
+    def scoreBlock(self, queryVectors, excludeRows: np.ndarray = None, mask: np.ndarray = None):
+        blockScores = toDenseArray(queryVectors @ self.vectorsT).astype(np.float32, copy=False)
+
+        if excludeRows is not None:
+            blockScores[np.arange(len(excludeRows)), excludeRows] = -np.inf
+
+        # filtered out movies can never reach the top N selection
+        if mask is not None:
+            blockScores[:, ~mask] = -np.inf
+
+        return blockScores
+
+    def search(self, queryVectors, n: int, excludeRows: np.ndarray = None, mask: np.ndarray = None):
+        nQueries = queryVectors.shape[0]
+        n = min(n, self.vectors.shape[0])
+
+        resultIndexes = np.empty((nQueries, n), dtype=np.int32)
+        resultScores = np.empty((nQueries, n), dtype=np.float32)
+
+        for start in range(0, nQueries, self.blockSize):
+            stop = min(start + self.blockSize, nQueries)
+            blockExcludeRows = None if excludeRows is None else excludeRows[start:stop]
+
+            blockScores = self.scoreBlock(queryVectors=queryVectors[start:stop], excludeRows=blockExcludeRows, mask=mask)
+            resultIndexes[start:stop], resultScores[start:stop] = selectTopN(scores=blockScores, n=n)
+
+        # fewer than n movies passed the exclusions and filters
+        resultIndexes[np.isneginf(resultScores)] = -1
+
+        return resultIndexes, resultScores
+
+
+class IvfEngine:
+    def __init__(
+        self, vectors, centroids: np.ndarray, assignments: np.ndarray, nProbes: int = IVF_PROBES, blockSize: int = 256
+    ) -> None:
+        self.vectors = vectors
+        self.nProbes = min(nProbes, centroids.shape[0])
+        self.blockSize = blockSize
+
+        # terms added by incremental vocabulary updates have no weight in the centroids
+        self.centroidsT = np.zeros((vectors.shape[1], centroids.shape[0]), dtype=np.float32)
+        self.centroidsT[: centroids.shape[1]] = centroids.T
+
+        self.setAssignments(assignments=assignments)
+
+    def setAssignments(self, assignments: np.ndarray):
+        nLists = self.centroidsT.shape[1]
+
+        self.assignments = assignments
+        self.listRows = np.argsort(assignments, kind='stable').astype(np.int32)
+        self.listOffsets = np.searchsorted(assignments[self.listRows], np.arange(nLists + 1))
+        self.listSizes = np.diff(self.listOffsets)
+
+        # vectors are stored list by list, so the non zeros of a probed list are one contiguous range
+        listVectors = self.vectors[self.listRows]
+        self.listData = listVectors.data
+        self.listTerms = listVectors.indices
+        self.listIndptr = listVectors.indptr
+        self.listNnzRows = np.repeat(np.arange(len(self.listRows), dtype=np.int32), np.diff(self.listIndptr))
+
+        # lists are also kept transposed, a block of queries scores a probed list with a single sparse product
+        self.listVectorsT = [
+            listVectors[self.listOffsets[probe]:self.listOffsets[probe + 1]].T.tocsr() for probe in range(nLists)
+        ]
+
+    def scoreList(self, queryVector: np.ndarray, probe: int):
+        start, stop = self.listOffsets[probe], self.listOffsets[probe + 1]
+        nnzStart, nnzStop = self.listIndptr[start], self.listIndptr[stop]
+
+        products = self.listData[nnzStart:nnzStop] * queryVector[self.listTerms[nnzStart:nnzStop]]
+
+        return np.bincount(self.listNnzRows[nnzStart:nnzStop] - start, weights=products, minlength=stop - start)
+
+    def scoreCandidates(self, queryVectors, excludeRows: np.ndarray = None, mask: np.ndarray = None):
+        nQueries = queryVectors.shape[0]
+        # a single query, as on the recommendation page, skips the sparse product overhead
+        queryVector = toDenseArray(queryVectors).ravel() if nQueries == 1 else None
+
+        # only the movies listed under the nProbes closest centroids are scored exactly
+        centroidScores = toDenseArray(queryVectors @ self.centroidsT)
+        queryProbes, _ = selectTopN(scores=centroidScores, n=self.nProbes)
+
+        # each query lays its probed lists side by side, rows are padded to the longest candidate set
+        probeSizes = self.listSizes[queryProbes]
+        probeStarts = np.cumsum(probeSizes, axis=1) - probeSizes
+        nCandidates = max(int(probeSizes.sum(axis=1).max()), 1)
+
+        candidateRows = np.zeros((nQueries, nCandidates), dtype=np.int32)
+        candidateScores = np.full((nQueries, nCandidates), -np.inf, dtype=np.float32)
+
+        # one sparse product per probed list scores every query of the block that probes it
+        for probe in np.unique(queryProbes):
+            if self.listSizes[probe] == 0:
+                continue
+
+            queries, slots = np.nonzero(queryProbes == probe)
+            columns = probeStarts[queries, slots][:, None] + np.arange(self.listSizes[probe])
+
+            candidateRows[queries[:, None], columns] = self.listRows[self.listOffsets[probe]:self.listOffsets[probe + 1]]
+            if queryVector is not None:
+                candidateScores[queries[:, None], columns] = self.scoreList(queryVector=queryVector, probe=probe)
+            else:
+                candidateScores[queries[:, None], columns] = toDenseArray(queryVectors[queries] @ self.listVectorsT[probe])
+
+        if excludeRows is not None:
+            candidateScores[candidateRows == excludeRows[:, None]] = -np.inf
+
+        if mask is not None:
+            candidateScores[~mask[candidateRows]] = -np.inf
+
+        return candidateRows, candidateScores
+
+    def search(self, queryVectors, n: int, excludeRows: np.ndarray = None, mask: np.ndarray = None):
+        nQueries = queryVectors.shape[0]
+
+        resultIndexes = np.full((nQueries, n), -1, dtype=np.int32)
+        resultScores = np.full((nQueries, n), -np.inf, dtype=np.float32)
+
+        for start in range(0, nQueries, self.blockSize):
+            stop = min(start + self.blockSize, nQueries)
+            blockExcludeRows = None if excludeRows is None else excludeRows[start:stop]
+
+            candidateRows, candidateScores = self.scoreCandidates(
+                queryVectors=queryVectors[start:stop], excludeRows=blockExcludeRows, mask=mask
+            )
+            topPositions, topScores = selectTopN(scores=candidateScores, n=n)
+
+            resultIndexes[start:stop, : topPositions.shape[1]] = np.take_along_axis(candidateRows, topPositions, axis=1)
+            resultScores[start:stop, : topPositions.shape[1]] = topScores
+
+        # fewer than n movies were probed or passed the exclusions and filters
+        resultIndexes[np.isneginf(resultScores)] = -1
+
+        return resultIndexes, resultScores
+
+
+def applyTagVectorsDelta(vectors, tagVectorsDelta: dict):
+    nMovies = int(tagVectorsDelta['nMovies'])
+    deltaVectors = sp.csr_matrix(
+        (tagVectorsDelta['data'], tagVectorsDelta['indices'], tagVectorsDelta['indptr']),
+        shape=tuple(tagVectorsDelta['shape']),
+    )
+
+    vectors = sp.csr_matrix((vectors.data, vectors.indices, vectors.indptr), shape=(vectors.shape[0], deltaVectors.shape[1]))
+
+    rowSelector = np.arange(nMovies)
+    rowSelector[tagVectorsDelta['rows']] = vectors.shape[0] + np.arange(deltaVectors.shape[0])
+    updatedVectors = sp.vstack([vectors, deltaVectors], format='csr')[rowSelector]
+
+    return updatedVectors
+
+
+def applyIvfAssignmentsDelta(assignments: np.ndarray, tagVectorsDelta: dict):
+    updatedAssignments = np.zeros(int(tagVectorsDelta['nMovies']), dtype=np.int32)
+    updatedAssignments[: len(assignments)] = assignments
+    updatedAssignments[tagVectorsDelta['rows']] = tagVectorsDelta['assignments']
+
+    return updatedAssignments
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+CALENDAR_FEATURES = {
+    'hour': np.int8,
+    'day': np.int8,
+    'month': np.int8,
+    'year': np.int16,
+    'quarter': np.int8,
+    'dayofyear': np.int16,
+}
+NANOSECONDS_PER_HOUR = 3600 * 10**9
+NANOSECONDS_PER_DAY = 24 * NANOSECONDS_PER_HOUR
+
+
+def toTimestamps(datetimes):
+    return np.asarray(datetimes, dtype='datetime64[ns]').view(np.int64)
+
+
+def getCivilDates(days: np.ndarray):
+    # days since 1970-01-01 to proleptic gregorian dates, with years starting in March so leap days fall last
+    shiftedDays = days + 719468
+    era = shiftedDays // 146097
+    dayOfEra = shiftedDays - era * 146097
+    yearOfEra = (dayOfEra - dayOfEra // 1460 + dayOfEra // 36524 - dayOfEra // 146096) // 365
+    dayOfMarchYear = dayOfEra - (365 * yearOfEra + yearOfEra // 4 - yearOfEra // 100)
+    marchMonth = (5 * dayOfMarchYear + 2) // 153
+
+    day = dayOfMarchYear - (153 * marchMonth + 2) // 5 + 1
+    month = np.where(marchMonth < 10, marchMonth + 3, marchMonth - 9)
+    year = yearOfEra + era * 400 + (month <= 2)
+
+    isLeapYear = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    dayOfYear = np.where(month <= 2, dayOfMarchYear - 305, dayOfMarchYear + 60 + isLeapYear)
+
+    return year, month, day, dayOfYear
+
+
+def createCalendarFeatures(datetimes, index: pd.Index = None):
+    timestamps = toTimestamps(datetimes)
+
+    days = timestamps // NANOSECONDS_PER_DAY
+    firstDay = days.min() if len(days) > 0 else 0
+    nDays = days.max() - firstDay + 1 if len(days) > 0 else 0
+
+    if nDays < len(days):
+        # sub daily series repeat their days, dates are built once per calendar day and gathered
+        calendarDays = np.arange(firstDay, firstDay + nDays)
+        dayPositions = days - firstDay
+    else:
+        calendarDays = days
+        dayPositions = slice(None)
+
+    year, month, day, dayOfYear = getCivilDates(days=calendarDays)
+    calendarFeatures = {
+        'day': day,
+        'month': month,
+        'year': year,
+        'quarter': (month - 1) // 3 + 1,
+        'dayofyear': dayOfYear,
+    }
+
+    features = {'hour': (timestamps - days * NANOSECONDS_PER_DAY) // NANOSECONDS_PER_HOUR}
+    for feature, values in calendarFeatures.items():
+        features[feature] = values.astype(CALENDAR_FEATURES[feature])[dayPositions]
+
+    calendarFeaturesDf = pd.DataFrame(
+        {feature: features[feature].astype(dtype, copy=False) for feature, dtype in CALENDAR_FEATURES.items()},
+        index=index,
+    )
+
+    return calendarFeaturesDf
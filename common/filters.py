@@ -0,0 +1,106 @@
+import numpy as np
+
+YEAR_BUCKET_SIZE = 5
+MOVIE_VOTE_TIERS = [0, 1000, 2500, 5000, 10000]
+FILTER_FAMILIES = {
+    'genreNames': 'genreBitmaps',
+    'yearBuckets': 'yearBitmaps',
+    'voteTiers': 'voteBitmaps',
+}
+
+
+def packBitmaps(memberships: np.ndarray):
+    # one bit per movie, eight movies per byte
+    return np.packbits(memberships, axis=1)
+
+
+def unpackBitmaps(bitmaps: np.ndarray, nMovies: int):
+    return np.unpackbits(bitmaps, axis=1, count=nMovies).astype(bool)
+
+
+def createFilterIndex(genreLists: list, years: np.ndarray, voteCounts: np.ndarray):
+    nMovies = len(genreLists)
+
+    genreNames = np.array(sorted({genre for genres in genreLists for genre in genres}), dtype=str)
+    genreRows = np.repeat(np.arange(nMovies), [len(genres) for genres in genreLists])
+    genreCodes = np.searchsorted(genreNames, [genre for genres in genreLists for genre in genres])
+    genreMemberships = np.zeros((len(genreNames), nMovies), dtype=bool)
+    genreMemberships[genreCodes, genreRows] = True
+
+    # movies without a release year belong to no bucket
+    hasYear = ~np.isnan(years)
+    movieBuckets = (years[hasYear] // YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE).astype(np.int32)
+    yearBuckets = np.unique(movieBuckets)
+    yearMemberships = np.zeros((len(yearBuckets), nMovies), dtype=bool)
+    yearMemberships[np.searchsorted(yearBuckets, movieBuckets), np.flatnonzero(hasYear)] = True
+
+    # tiers are cumulative, tier t holds every movie with more than t votes
+    voteTiers = np.array(MOVIE_VOTE_TIERS, dtype=np.int32)
+    voteMemberships = np.asarray(voteCounts)[np.newaxis, :] > voteTiers[:, np.newaxis]
+
+    filterIndex = {
+        'nMovies': np.int64(nMovies),
+        'genreNames': genreNames,
+        'genreBitmaps': packBitmaps(genreMemberships),
+        'yearBuckets': yearBuckets,
+        'yearBitmaps': packBitmaps(yearMemberships),
+        'voteTiers': voteTiers,
+        'voteBitmaps': packBitmaps(voteMemberships),
+    }
+
+    return filterIndex
+
+
+def createFilterMask(filterIndex: dict, genres: list = [], yearRange: tuple = None, minVotes: int = None):
+    bitmapGroups = []
+
+    if len(genres) > 0:
+        # any of the selected genres
+        isSelected = np.isin(filterIndex['genreNames'], genres)
+        bitmapGroups.append(np.bitwise_or.reduce(filterIndex['genreBitmaps'][isSelected], axis=0))
+
+    if yearRange is not None:
+        # buckets starting inside [start, stop)
+        start, stop = yearRange
+        isSelected = (filterIndex['yearBuckets'] >= start) & (filterIndex['yearBuckets'] < stop)
+        bitmapGroups.append(np.bitwise_or.reduce(filterIndex['yearBitmaps'][isSelected], axis=0))
+
+    if minVotes is not None:
+        # bitmaps only exist for the tiers, any other threshold would be rounded to a looser one
+        isTier = filterIndex['voteTiers'] == minVotes
+        if not isTier.any():
+            raise ValueError(f"Unknown vote tier {minVotes}. Options: {filterIndex['voteTiers'].tolist()}")
+        bitmapGroups.append(filterIndex['voteBitmaps'][np.flatnonzero(isTier)[0]])
+
+    if len(bitmapGroups) == 0:
+        return None
+
+    # filters are combined on the packed bytes, only the final mask is unpacked
+    packedMask = np.bitwise_and.reduce(bitmapGroups, axis=0)
+
+    return np.unpackbits(packedMask, count=int(filterIndex['nMovies'])).astype(bool)
+
+
+def applyFilterIndexDelta(filterIndex: dict, filterIndexDelta: dict):
+    nMovies = int(filterIndexDelta['nMovies'])
+    rows = filterIndexDelta['rows']
+    updatedFilterIndex = {'nMovies': np.int64(nMovies)}
+
+    for keysName, bitmapsName in FILTER_FAMILIES.items():
+        # updated movies may bring genres or year buckets the catalog did not have yet
+        keys = np.union1d(filterIndex[keysName], filterIndexDelta[keysName])
+
+        memberships = np.zeros((len(keys), nMovies), dtype=bool)
+        currentMemberships = unpackBitmaps(filterIndex[bitmapsName], nMovies=int(filterIndex['nMovies']))
+        memberships[np.searchsorted(keys, filterIndex[keysName]), : currentMemberships.shape[1]] = currentMemberships
+
+        deltaMemberships = np.zeros((len(keys), len(rows)), dtype=bool)
+        deltaMemberships[np.searchsorted(keys, filterIndexDelta[keysName])] = unpackBitmaps(
+            filterIndexDelta[bitmapsName], nMovies=len(rows)
+        )
+        memberships[:, rows] = deltaMemberships
+
+        updatedFilterIndex[keysName] = keys
+        updatedFilterIndex[bitmapsName] = packBitmaps(memberships)
+
+    return updatedFilterIndex
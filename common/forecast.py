@@ -0,0 +1,21 @@
+import pandas as pd
+import xgboost as xgb
+
+from common.features import createCalendarFeatures
+from common.models import predictBooster
+
+FORECAST_HORIZONS = [7, 30, 365]
+
+
+def createForecastIndex(lastTimestamp: pd.Timestamp, horizonDays: int):
+    return pd.date_range(start=lastTimestamp + pd.Timedelta(hours=1), periods=horizonDays * 24, freq='H', name='datetime')
+
+
+def createForecast(booster: xgb.Booster, lastTimestamp: pd.Timestamp, horizonDays: int):
+    forecastIndex = createForecastIndex(lastTimestamp=lastTimestamp, horizonDays=horizonDays)
+
+    # the whole horizon is one feature block and one predict call, columns follow the booster's feature order
+    features = createCalendarFeatures(datetimes=forecastIndex)[booster.feature_names].to_numpy()
+    forecast = pd.Series(predictBooster(booster=booster, features=features), index=forecastIndex, name='forecast')
+
+    return forecast
@@ -0,0 +1,22 @@
+import hashlib
+
+import numpy as np
+import xgboost as xgb
+
+BOOSTER_FORMAT = 'ubj'
+
+
+def getModelVersion(modelBytes: bytes):
+    return hashlib.sha1(modelBytes).hexdigest()[:12]
+
+
+def loadBooster(modelBytes: bytes):
+    booster = xgb.Booster()
+    booster.load_model(bytearray(modelBytes))
+
+    return booster
+
+
+def predictBooster(booster: xgb.Booster, features: np.ndarray):
+    # inplace_predict scores the numpy block directly, no DMatrix copy or frame validation
+    return booster.inplace_predict(np.ascontiguousarray(features, dtype=np.float32)).astype(np.float32)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def createTitleIndex(titles: list):
+    titleIndex = {}
+
+    for row, title in enumerate(titles):
+        titleIndex.setdefault(title, []).append(row)
+
+    return titleIndex
+
+
+def getTitleRow(titleIndex: dict, title: str):
+    # duplicated titles resolve to their first catalog row, use titleIndex[title] to reach the others
+    return titleIndex[title][0]
+
+
+def selectTopN(scores: np.ndarray, n: int):
+    n = min(n, scores.shape[-1])
+    kth = scores.shape[-1] - n
+
+    topIndexes = np.argpartition(scores, kth, axis=-1)[..., kth:]
+    topScores = np.take_along_axis(scores, topIndexes, axis=-1)
+
+    order = np.argsort(-topScores, axis=-1, kind='stable')
+    topIndexes = np.take_along_axis(topIndexes, order, axis=-1)
+    topScores = np.take_along_axis(topScores, order, axis=-1)
+
+    return topIndexes, topScores
+
+
+def getNeighborRecommendations(movieRow: int, neighborIndex: dict, n: int):
+    # neighbor rows are stored sorted by similarity and exclude the movie itself
+    recommendationIndexes = neighborIndex['indexes'][movieRow, :n]
+    recommendationScores = neighborIndex['scores'][movieRow, :n]
+
+    # approximate engines pad rows with -1 when they find fewer than n candidates
+    isFound = recommendationIndexes >= 0
+    recommendationIndexes = recommendationIndexes[isFound]
+    recommendationScores = recommendationScores[isFound]
+
+    return recommendationIndexes, recommendationScores
+
+
+def applyNeighborIndexDelta(neighborIndex: dict, neighborIndexDelta: dict):
+    nMovies = int(neighborIndexDelta['nMovies'])
+    nPreviousMovies, nNeighbors = neighborIndex['indexes'].shape
+
+    neighborIndexes = np.zeros((nMovies, nNeighbors), dtype=np.int32)
+    neighborScores = np.zeros((nMovies, nNeighbors), dtype=np.float32)
+    neighborIndexes[:nPreviousMovies] = neighborIndex['indexes']
+    neighborScores[:nPreviousMovies] = neighborIndex['scores']
+
+    neighborIndexes[neighborIndexDelta['rows']] = neighborIndexDelta['indexes']
+    neighborScores[neighborIndexDelta['rows']] = neighborIndexDelta['scores']
+
+    updatedNeighborIndex = {
+        'indexes': neighborIndexes,
+        'scores': neighborScores,
+    }
+
+    return updatedNeighborIndex
+
+
+def applyMovieCardsDelta(movieCards: pd.DataFrame, movieCardsDelta: pd.DataFrame):
+    movieCardsDelta = movieCardsDelta.set_index('row')
+
+    updatedMovieCards = pd.concat([movieCards.drop(index=movieCardsDelta.index, errors='ignore'), movieCardsDelta])
+    updatedMovieCards = updatedMovieCards.sort_index().rename_axis(None)
+
+    return updatedMovieCards
+
+
+def getEngineRecommendations(movieRow: int, engine, n: int, mask: np.ndarray = None):
+    movieRows = np.array([movieRow])
+    recommendationIndexes, recommendationScores = engine.search(
+        queryVectors=engine.vectors[movieRows], n=n, excludeRows=movieRows, mask=mask
+    )
+
+    isFound = recommendationIndexes[0] >= 0
+
+    return recommendationIndexes[0][isFound], recommendationScores[0][isFound]
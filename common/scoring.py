@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def foldLogisticRegression(coefficients: np.ndarray, intercept: float, means: np.ndarray, scales: np.ndarray):
+    # standardization folded into the weights, w . (x - mean) / scale + b == (w / scale) . x + b - w . mean / scale
+    weights = np.asarray(coefficients, dtype=np.float64) / scales
+    bias = float(intercept - np.dot(weights, means))
+
+    return weights, bias
+
+
+def createLogisticScorer(features: list, weights: np.ndarray, bias: float):
+    logisticScorer = {'features': list(features), 'weights': np.asarray(weights).tolist(), 'bias': float(bias)}
+
+    return logisticScorer
+
+
+def scoreLogistic(logisticScorer: dict, responses: np.ndarray):
+    # one probability per row of responses, columns in the scorer's feature order
+    logits = np.asarray(responses, dtype=np.float64) @ np.asarray(logisticScorer['weights']) + logisticScorer['bias']
+
+    return 1 / (1 + np.exp(-logits))
@@ -0,0 +1,107 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+TITLE_GRAM_SIZE = 3
+TITLE_SEARCH_RESULTS = 20
+
+
+def normalizeTitle(title: str):
+    return re.sub(r'\W+', ' ', title.lower()).strip()
+
+
+def getTitleGrams(title: str):
+    # padding turns word starts into grams, so one or two letter queries still match by prefix
+    paddedTitle = f' {title} '
+
+    return {paddedTitle[start : start + TITLE_GRAM_SIZE] for start in range(len(paddedTitle) - TITLE_GRAM_SIZE + 1)}
+
+
+def createTitleSearchIndex(titles: list, voteCounts: np.ndarray):
+    # one entry per distinct title, ranked by its most voted movie
+    titlesDf = pd.DataFrame({'title': titles, 'voteCount': voteCounts})
+    titlesDf = titlesDf.groupby('title', as_index=False)['voteCount'].max()
+    titlesDf.sort_values(by=['voteCount', 'title'], ascending=[False, True], inplace=True)
+
+    rankTitles = titlesDf['title'].to_numpy(dtype=str)
+    normalizedTitles = np.array([normalizeTitle(title) for title in rankTitles], dtype=str)
+
+    # posting lists hold title ranks, appended in rank order so every list is already sorted
+    postings = {}
+    for rank, title in enumerate(normalizedTitles):
+        for gram in getTitleGrams(title):
+            postings.setdefault(gram, []).append(rank)
+
+    grams = np.array(sorted(postings), dtype=str)
+    postingSizes = [len(postings[gram]) for gram in grams]
+
+    titleSearchIndex = {
+        'rankTitles': rankTitles,
+        'normalizedTitles': normalizedTitles,
+        'grams': grams,
+        'indptr': np.concatenate([[0], np.cumsum(postingSizes)]).astype(np.int64),
+        'ranks': np.concatenate([postings[gram] for gram in grams]).astype(np.int32),
+    }
+
+    return titleSearchIndex
+
+
+def getPostingList(titleSearchIndex: dict, gramStart: int, gramStop: int = None):
+    gramStop = gramStart + 1 if gramStop is None else gramStop
+    start, stop = titleSearchIndex['indptr'][gramStart], titleSearchIndex['indptr'][gramStop]
+
+    return titleSearchIndex['ranks'][start:stop]
+
+
+def getCandidateRanks(titleSearchIndex: dict, query: str):
+    grams = titleSearchIndex['grams']
+
+    if len(query) < TITLE_GRAM_SIZE:
+        # every gram opening a word with the query, their posting lists are contiguous
+        prefix = f' {query}'
+        gramStart = np.searchsorted(grams, prefix, side='left')
+        gramStop = np.searchsorted(grams, prefix + '\uffff', side='left')
+
+        return np.unique(getPostingList(titleSearchIndex=titleSearchIndex, gramStart=gramStart, gramStop=gramStop))
+
+    queryGrams = [query[start : start + TITLE_GRAM_SIZE] for start in range(len(query) - TITLE_GRAM_SIZE + 1)]
+    gramPositions = np.searchsorted(grams, queryGrams)
+
+    postingLists = []
+    for gram, position in zip(queryGrams, gramPositions):
+        if position == len(grams) or grams[position] != gram:
+            return np.array([], dtype=np.int32)
+
+        postingLists.append(getPostingList(titleSearchIndex=titleSearchIndex, gramStart=position))
+
+    # intersect from the shortest list, candidates stay sorted by rank
+    postingLists.sort(key=len)
+    candidateRanks = postingLists[0]
+    for postingList in postingLists[1:]:
+        candidateRanks = np.intersect1d(candidateRanks, postingList, assume_unique=True)
+
+    return candidateRanks
+
+
+def searchTitles(titleSearchIndex: dict, query: str, n: int = TITLE_SEARCH_RESULTS):
+    query = normalizeTitle(query)
+
+    if len(query) == 0:
+        return titleSearchIndex['rankTitles'][:n].tolist()
+
+    candidateRanks = getCandidateRanks(titleSearchIndex=titleSearchIndex, query=query)
+
+    if len(query) < TITLE_GRAM_SIZE:
+        return titleSearchIndex['rankTitles'][candidateRanks[:n]].tolist()
+
+    # grams only prove the pieces exist, the title still has to contain the whole query
+    matches = []
+    for rank in candidateRanks:
+        if query in titleSearchIndex['normalizedTitles'][rank]:
+            matches.append(titleSearchIndex['rankTitles'][rank])
+
+        if len(matches) == n:
+            break
+
+    return matches
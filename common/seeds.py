@@ -0,0 +1,105 @@
+import numpy as np
+import scipy.sparse as sp
+
+from common.engines import toDenseArray
+from common.recommender import getTitleRow, selectTopN
+
+SEED_MODES = ['batch', 'centroid', 'weighted']
+
+
+def getSeedRows(titleIndex: dict, seedTitles: list):
+    return [getTitleRow(titleIndex=titleIndex, title=title) for title in seedTitles]
+
+
+def createSeedMatrix(seedLists: list, nMovies: int, seedWeights: list = None):
+    # one row per watch list, one column per movie, weights default to a plain average
+    if seedWeights is None:
+        seedWeights = [np.full(len(seedRows), 1 / len(seedRows)) for seedRows in seedLists]
+
+    rows = np.repeat(np.arange(len(seedLists)), [len(seedRows) for seedRows in seedLists])
+    columns = np.concatenate([np.asarray(seedRows, dtype=np.int32) for seedRows in seedLists])
+    weights = np.concatenate([np.asarray(weights, dtype=np.float32) for weights in seedWeights])
+
+    seedMatrix = sp.csr_matrix((weights, (rows, columns)), shape=(len(seedLists), nMovies))
+    seedMatrix.sum_duplicates()
+
+    return seedMatrix
+
+
+def dropSeeds(resultIndexes: np.ndarray, resultScores: np.ndarray, seedMatrix, n: int):
+    nQueries, nResults = resultIndexes.shape
+
+    queryRows = np.repeat(np.arange(nQueries), nResults)
+    isSeed = toDenseArray(seedMatrix[queryRows, np.maximum(resultIndexes.ravel(), 0)]).reshape(nQueries, nResults) != 0
+    isDropped = isSeed | (resultIndexes < 0)
+
+    # kept results move ahead of dropped ones, keeping their rank order
+    order = np.argsort(isDropped, axis=1, kind='stable')[:, :n]
+    isDropped = np.take_along_axis(isDropped, order, axis=1)
+
+    resultIndexes = np.where(isDropped, -1, np.take_along_axis(resultIndexes, order, axis=1)).astype(np.int32)
+    resultScores = np.where(isDropped, -np.inf, np.take_along_axis(resultScores, order, axis=1)).astype(np.float32)
+
+    return resultIndexes, resultScores
+
+
+def getBatchRecommendations(seedRows: list, engine, n: int, mask: np.ndarray = None):
+    seedRows = np.asarray(seedRows, dtype=np.int32)
+
+    return engine.search(queryVectors=engine.vectors[seedRows], n=n, excludeRows=seedRows, mask=mask)
+
+
+def getCentroidRecommendations(seedLists: list, engine, n: int, seedWeights: list = None, mask: np.ndarray = None):
+    seedMatrix = createSeedMatrix(seedLists=seedLists, nMovies=engine.vectors.shape[0], seedWeights=seedWeights)
+
+    # watch list centroids, renormalized so their scores stay cosine similarities
+    queryVectors = seedMatrix @ engine.vectors
+    queryNorms = np.sqrt(np.asarray(queryVectors.multiply(queryVectors).sum(axis=1))).ravel()
+    queryVectors = sp.diags(1 / np.maximum(queryNorms, 1e-12)) @ queryVectors
+
+    maxSeeds = max(len(seedRows) for seedRows in seedLists)
+    resultIndexes, resultScores = engine.search(queryVectors=queryVectors.tocsr(), n=n + maxSeeds, mask=mask)
+
+    return dropSeeds(resultIndexes=resultIndexes, resultScores=resultScores, seedMatrix=seedMatrix, n=n)
+
+
+def createNeighborMatrix(neighborIndex: dict):
+    nMovies, nNeighbors = neighborIndex['indexes'].shape
+
+    isNeighbor = neighborIndex['indexes'] >= 0
+    neighborMatrix = sp.csr_matrix(
+        (
+            np.where(isNeighbor, neighborIndex['scores'], 0).ravel(),
+            np.where(isNeighbor, neighborIndex['indexes'], 0).ravel(),
+            np.arange(0, nMovies * nNeighbors + 1, nNeighbors),
+        ),
+        shape=(nMovies, nMovies),
+    )
+
+    return neighborMatrix
+
+
+def getWeightedRecommendations(
+    seedLists: list, neighborMatrix, n: int, seedWeights: list = None, mask: np.ndarray = None, blockSize: int = 256
+):
+    nMovies = neighborMatrix.shape[0]
+    seedMatrix = createSeedMatrix(seedLists=seedLists, nMovies=nMovies, seedWeights=seedWeights)
+
+    # weighted sum of the seeds' stored neighbor scores, movies outside every seed's top K score zero
+    maxSeeds = max(len(seedRows) for seedRows in seedLists)
+    nResults = min(n + maxSeeds, nMovies)
+
+    resultIndexes = np.empty((len(seedLists), nResults), dtype=np.int32)
+    resultScores = np.empty((len(seedLists), nResults), dtype=np.float32)
+
+    for start in range(0, len(seedLists), blockSize):
+        stop = min(start + blockSize, len(seedLists))
+        blockScores = toDenseArray(seedMatrix[start:stop] @ neighborMatrix).astype(np.float32)
+        if mask is not None:
+            blockScores[:, ~mask] = 0
+
+        resultIndexes[start:stop], resultScores[start:stop] = selectTopN(scores=blockScores, n=nResults)
+
+    resultIndexes[resultScores <= 0] = -1
+
+    return dropSeeds(resultIndexes=resultIndexes, resultScores=resultScores, seedMatrix=seedMatrix, n=n)
@@ -2,4 +2,9 @@ import streamlit as st
 
 def fullStateReset():
     for key in st.session_state:
-        del st.session_state[key]
\ No newline at end of file
+        del st.session_state[key]
+
+def stateReset(keys: list):
+    for key in keys:
+        if key in st.session_state:
+            del st.session_state[key]
@@ -1,15 +1,93 @@
+import argparse
 import datetime as dt
 
 from aws.client import createSession
-from etl import loadWorkedMoviesDatabase, loadXbgPJMERegressionObject, loadDiverceMlObject
+from common.engines import MOVIE_ENGINES
+from etl import loadWorkedMoviesDatabase, loadMovieCatalogUpdate, loadXbgPJMRegionObjects, loadXbgPJMERegressionUpdate, loadPJMEBacktest, loadDiverceMlObject
+from etl.backtest import BACKTEST_MODES
+from etl.extract import CSV_ENGINES, setExtractOptions
+from etl.refresh import REFRESH_MODES
+from etl.training import TRAINING_MODES
+from etl.transform import PJM_REGIONS
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--movies-update',
+        default=None,
+        help='Folder with movies_db.csv and credits.csv holding new or changed movies. Only runs the incremental movie catalog update.',
+    )
+    parser.add_argument('--extend-vocabulary', action='store_true', help='Add new tag terms found in the movies update.')
+    parser.add_argument(
+        '--neighbor-engine', default='exact', choices=MOVIE_ENGINES, help='Engine used to build the movie neighbor index.'
+    )
+    parser.add_argument(
+        '--pjme-update',
+        default=None,
+        help='Folder with <region>_hourly.csv files holding new hours. Only refreshes the served boosters of --regions (PJME by default) on the hours after their data.',
+    )
+    parser.add_argument(
+        '--pjme-refresh',
+        default='continue',
+        choices=REFRESH_MODES,
+        help='Keep boosting the served booster or refit it on a sliding window of recent hours.',
+    )
+    parser.add_argument(
+        '--pjme-backtest',
+        default=None,
+        choices=BACKTEST_MODES,
+        help='Only runs the walk-forward backtest of the PJME forecaster with expanding or sliding training windows.',
+    )
+    parser.add_argument(
+        '--regions',
+        nargs='+',
+        default=None,
+        choices=PJM_REGIONS,
+        help='PJM regions to train a forecaster for, defaults to every region with a <region>_hourly.csv in data/raw.',
+    )
+    parser.add_argument(
+        '--pjme-training',
+        default='sklearn',
+        choices=TRAINING_MODES,
+        help='PJME regressor training path, quantile builds the hist training matrix once and reuses it for evaluation.',
+    )
+    parser.add_argument('--threads', type=int, default=None, help='Threads per PJM booster, defaults to the cores left per worker.')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size for the backtest and the regions training, defaults to all cores.')
+    parser.add_argument('--csv-engine', default='c', choices=CSV_ENGINES, help='Parser for the raw csv sources.')
+    parser.add_argument(
+        '--chunk-rows',
+        type=int,
+        default=None,
+        help='Read the raw csv sources in chunks of this many rows, for sources that do not fit in memory.',
+    )
+    args = parser.parse_args()
+
+    setExtractOptions(engine=args.csv_engine, chunkRows=args.chunk_rows)
+
     startTime = dt.datetime.now()
 
     awsSession = createSession()
 
-    print(f'init etl!!')
-    loadWorkedMoviesDatabase(awsSession=awsSession)
-    loadXbgPJMERegressionObject(awsSession=awsSession)
-    loadDiverceMlObject(awsSession=awsSession)
-    print(f'finished etl. Process time {dt.datetime.now() - startTime} !!')
+    if args.pjme_backtest is not None:
+        print(f'init pjme backtest!!')
+        loadPJMEBacktest(awsSession=awsSession, mode=args.pjme_backtest, nWorkers=args.workers, nThreads=args.threads)
+        print(f'finished pjme backtest. Process time {dt.datetime.now() - startTime} !!')
+    elif args.pjme_update is not None:
+        print(f'init pjme model refresh!!')
+        for region in args.regions or ['PJME']:
+            loadXbgPJMERegressionUpdate(
+                awsSession=awsSession, dataPath=args.pjme_update, refreshMode=args.pjme_refresh, nThreads=args.threads, region=region
+            )
+        print(f'finished pjme model refresh. Process time {dt.datetime.now() - startTime} !!')
+    elif args.movies_update is not None:
+        print(f'init movie catalog update!!')
+        loadMovieCatalogUpdate(awsSession=awsSession, dataPath=args.movies_update, extendVocabulary=args.extend_vocabulary)
+        print(f'finished movie catalog update. Process time {dt.datetime.now() - startTime} !!')
+    else:
+        print(f'init etl!!')
+        loadWorkedMoviesDatabase(awsSession=awsSession, neighborEngine=args.neighbor_engine)
+        loadXbgPJMRegionObjects(
+            awsSession=awsSession, regions=args.regions, trainingMode=args.pjme_training, nWorkers=args.workers, nThreads=args.threads
+        )
+        loadDiverceMlObject(awsSession=awsSession)
+        print(f'finished etl. Process time {dt.datetime.now() - startTime} !!')
@@ -1 +1 @@
-from etl.load import loadWorkedMoviesDatabase, loadXbgPJMERegressionObject, loadDiverceMlObject
+from etl.load import loadWorkedMoviesDatabase, loadMovieCatalogUpdate, loadXbgPJMRegionObjects, loadXbgPJMERegressionUpdate, loadPJMEBacktest, loadDiverceMlObject
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from etl.profiling import trackResources
+from etl.training import getPoolSizes
+from etl.transform import PJME_FEATURES, PJME_TARGET, createPJMEDf
+
+BACKTEST_MODES = ['expanding', 'sliding']
+BACKTEST_FOLDS = 8
+BACKTEST_TEST_DAYS = 90
+BACKTEST_WINDOW_DAYS = 5 * 365
+BACKTEST_VALIDATION_DAYS = 30
+BACKTEST_ROUNDS = 10000
+BACKTEST_EARLY_STOPPING = 50
+BACKTEST_PARAMS = {'objective': 'reg:squarederror', 'eta': 0.01, 'tree_method': 'hist'}
+
+# filled once per worker process, folds only travel as row positions
+backtestData = {}
+
+
+def initBacktestWorker(features: np.ndarray, target: np.ndarray, nThreads: int):
+    backtestData['features'] = features
+    backtestData['target'] = target
+    backtestData['nThreads'] = nThreads
+
+
+def createBacktestFolds(
+    index: pd.DatetimeIndex,
+    mode: str = 'expanding',
+    nFolds: int = BACKTEST_FOLDS,
+    testDays: int = BACKTEST_TEST_DAYS,
+    windowDays: int = BACKTEST_WINDOW_DAYS,
+    validationDays: int = BACKTEST_VALIDATION_DAYS,
+):
+    if mode not in BACKTEST_MODES:
+        raise ValueError(f'Unknown backtest mode {mode}. Options: {BACKTEST_MODES}')
+
+    folds = []
+
+    # test windows tile the end of the history, each fold trains on the hours before its window
+    for fold in range(nFolds):
+        testStart = index[-1] - pd.Timedelta(days=testDays * (nFolds - fold))
+        testStop = testStart + pd.Timedelta(days=testDays)
+        trainStart = index[0] if mode == 'expanding' else testStart - pd.Timedelta(days=windowDays)
+
+        # the last days before the test window early stop the booster, the test window stays unseen
+        folds.append(
+            {
+                'fold': fold,
+                'testTimestamp': testStart,
+                'trainStart': index.searchsorted(trainStart, side='left'),
+                'validationStart': index.searchsorted(testStart - pd.Timedelta(days=validationDays), side='right'),
+                'testStart': index.searchsorted(testStart, side='right'),
+                'testStop': index.searchsorted(testStop, side='right'),
+            }
+        )
+
+    return folds
+
+
+def runBacktestFold(fold: dict):
+    features, target, nThreads = backtestData['features'], backtestData['target'], backtestData['nThreads']
+    trainRows = slice(fold['trainStart'], fold['validationStart'])
+    validationRows = slice(fold['validationStart'], fold['testStart'])
+    testRows = slice(fold['testStart'], fold['testStop'])
+
+    dtrain = xgb.DMatrix(features[trainRows], label=target[trainRows], nthread=nThreads)
+    dvalidation = xgb.DMatrix(features[validationRows], label=target[validationRows], nthread=nThreads)
+
+    booster = xgb.train(
+        params={**BACKTEST_PARAMS, 'nthread': nThreads},
+        dtrain=dtrain,
+        num_boost_round=BACKTEST_ROUNDS,
+        evals=[(dvalidation, 'validation')],
+        early_stopping_rounds=BACKTEST_EARLY_STOPPING,
+        verbose_eval=False,
+    )
+
+    predictions = booster.inplace_predict(features[testRows], iteration_range=(0, booster.best_iteration + 1))
+
+    foldResult = {
+        'fold': fold['fold'],
+        'testTimestamp': fold['testTimestamp'],
+        'trainRows': fold['validationStart'] - fold['trainStart'],
+        'bestIteration': booster.best_iteration,
+        'actuals': target[testRows],
+        'errors': (predictions - target[testRows]).astype(np.float32),
+    }
+
+    return foldResult
+
+
+def aggregateBacktestResults(foldResults: list):
+    errorsDf = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    'fold': foldResult['fold'],
+                    'horizonDay': np.arange(len(foldResult['errors'])) // 24 + 1,
+                    'squaredError': foldResult['errors'].astype(np.float64) ** 2,
+                    'percentageError': np.abs(foldResult['errors'] / foldResult['actuals']) * 100,
+                }
+            )
+            for foldResult in foldResults
+        ],
+        ignore_index=True,
+    )
+
+    foldMetrics = errorsDf.groupby('fold').agg(rmse=('squaredError', 'mean'), mape=('percentageError', 'mean'))
+    foldMetrics['rmse'] = np.sqrt(foldMetrics['rmse'])
+    foldMetrics['testTimestamp'] = [foldResult['testTimestamp'] for foldResult in foldResults]
+    foldMetrics['trainRows'] = [foldResult['trainRows'] for foldResult in foldResults]
+    foldMetrics['bestIteration'] = [foldResult['bestIteration'] for foldResult in foldResults]
+
+    horizonMetrics = errorsDf.groupby('horizonDay').agg(rmse=('squaredError', 'mean'), mape=('percentageError', 'mean'))
+    horizonMetrics['rmse'] = np.sqrt(horizonMetrics['rmse'])
+
+    return foldMetrics, horizonMetrics
+
+
+def runPJMEBacktest(
+    mode: str = 'expanding',
+    nFolds: int = BACKTEST_FOLDS,
+    testDays: int = BACKTEST_TEST_DAYS,
+    nWorkers: int = None,
+    nThreads: int = None,
+):
+    pjmeDf = createPJMEDf()
+    folds = createBacktestFolds(index=pjmeDf.index, mode=mode, nFolds=nFolds, testDays=testDays)
+
+    nWorkers, nThreads = getPoolSizes(nTasks=len(folds), nWorkers=nWorkers, nThreads=nThreads)
+    initArgs = (pjmeDf[PJME_FEATURES].to_numpy(dtype=np.float32), pjmeDf[PJME_TARGET].to_numpy(dtype=np.float32), nThreads)
+
+    with trackResources(label=f'PJME {mode} backtest ({len(folds)} folds, {nWorkers} workers x {nThreads} threads)'):
+        if nWorkers == 1:
+            initBacktestWorker(*initArgs)
+            foldResults = list(map(runBacktestFold, folds))
+        else:
+            with ProcessPoolExecutor(max_workers=nWorkers, initializer=initBacktestWorker, initargs=initArgs) as executor:
+                foldResults = list(executor.map(runBacktestFold, folds))
+
+    foldMetrics, horizonMetrics = aggregateBacktestResults(foldResults=foldResults)
+
+    print(foldMetrics.to_string(float_format='{:,.2f}'.format))
+    print(f"mean fold rmse {foldMetrics['rmse'].mean():,.2f} MW, mean fold mape {foldMetrics['mape'].mean():.2f}%")
+
+    return foldMetrics, horizonMetrics
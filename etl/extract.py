@@ -1,32 +1,179 @@
 import os
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from etl.profiling import trackResources
 
 DATA_PATH = os.path.join(os.getcwd(), "data", "raw")
+CSV_ENGINES = ['c', 'pyarrow']
+CSV_CHUNK_ROWS = 100_000
+
+# declared columns are the only ones read, None marks text kept as object
+MOVIES_SCHEMA = {
+    'fileName': 'movies_db.csv',
+    'columns': {
+        'id': np.int32,
+        'title': None,
+        'genres': None,
+        'keywords': None,
+        'overview': None,
+        'release_date': None,
+        'popularity': np.float32,
+        'vote_average': np.float32,
+        'vote_count': np.int32,
+    },
+}
+CREDITS_SCHEMA = {
+    'fileName': 'credits.csv',
+    'columns': {'title': None, 'cast': None, 'crew': None},
+}
+DIVORCE_SCHEMA = {
+    'fileName': 'divorce_data.csv',
+    'sep': ';',
+    'columns': {**{f'Q{question}': np.int8 for question in range(1, 55)}, 'Divorce': np.int8},
+}
+
+# set once per process by etl.py, pool workers get them through their initializer
+extractOptions = {'engine': 'c', 'chunkRows': None}
+
+
+def setExtractOptions(engine: str = 'c', chunkRows: int = None):
+    if engine not in CSV_ENGINES:
+        raise ValueError(f'Unknown csv engine {engine}. Options: {CSV_ENGINES}')
+
+    extractOptions['engine'] = engine
+    extractOptions['chunkRows'] = chunkRows
+
+
+def getPJMHourlySchema(region: str):
+    pjmHourlySchema = {
+        'fileName': f'{region}_hourly.csv',
+        'columns': {'Datetime': None, f'{region}_MW': np.float32},
+        'dates': {'Datetime': '%Y-%m-%d %H:%M:%S'},
+    }
+
+    return pjmHourlySchema
+
+
+def getSchemaDtypes(schema: dict, columns: list):
+    # date columns are read as text and parsed with their declared format
+    dates = schema.get('dates', {})
+
+    return {column: schema['columns'][column] or object for column in columns if column not in dates}
+
+
+def parseSchemaDates(schema: dict, df: pd.DataFrame):
+    for column, dateFormat in schema.get('dates', {}).items():
+        if column in df.columns and not pd.api.types.is_datetime64_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format=dateFormat)
+
+    return df
+
 
+def readArrowCsv(schema: dict, filePath: str, columns: list):
+    # column types are set up front, pyarrow would otherwise infer dates out of text columns
+    dates = schema.get('dates', {})
+    columnTypes = {
+        column: pa.timestamp('ns') if column in dates else pa.from_numpy_dtype(schema['columns'][column] or np.str_)
+        for column in columns
+    }
 
-def getCreditsDb():
-    creditsDbFileName = 'credits.csv'
-    creditsDbDf = pd.read_csv(os.path.join(DATA_PATH, creditsDbFileName))
+    arrowTable = pacsv.read_csv(
+        filePath,
+        parse_options=pacsv.ParseOptions(delimiter=schema.get('sep', ','), newlines_in_values=True),
+        # empty text fields come back as missing values, like pandas' c parser reads them
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types=columnTypes,
+            timestamp_parsers=list(dates.values()),
+            strings_can_be_null=True,
+        ),
+    )
+
+    return arrowTable.to_pandas()
+
+
+def iterSourceChunks(schema: dict, dataPath: str = DATA_PATH, columns: list = None, chunkRows: int = CSV_CHUNK_ROWS):
+    columns = columns or list(schema['columns'])
+
+    # sources larger than memory stream through here, one typed block of rows at a time
+    with pd.read_csv(
+        os.path.join(dataPath, schema['fileName']),
+        sep=schema.get('sep', ','),
+        usecols=columns,
+        dtype=getSchemaDtypes(schema=schema, columns=columns),
+        chunksize=chunkRows,
+    ) as reader:
+        for chunk in reader:
+            yield parseSchemaDates(schema=schema, df=chunk)[columns]
+
+
+def readSource(schema: dict, dataPath: str = DATA_PATH, columns: list = None, chunkFilter=None):
+    columns = columns or list(schema['columns'])
+    engine, chunkRows = extractOptions['engine'], extractOptions['chunkRows']
+    nRows = 0
+
+    # pyarrow reads whole files only, chunked reads always go through pandas' c parser
+    readMode = f'c engine, {chunkRows:,} row chunks' if chunkRows else f'{engine} engine'
+    with trackResources(label=f"{schema['fileName']} ({readMode})", report=False) as stats:
+        if chunkRows is None:
+            filePath = os.path.join(dataPath, schema['fileName'])
+            if engine == 'pyarrow':
+                sourceDf = readArrowCsv(schema=schema, filePath=filePath, columns=columns)
+            else:
+                sourceDf = pd.read_csv(
+                    filePath,
+                    sep=schema.get('sep', ','),
+                    usecols=columns,
+                    dtype=getSchemaDtypes(schema=schema, columns=columns),
+                )
+                sourceDf = parseSchemaDates(schema=schema, df=sourceDf)[columns]
+            nRows = len(sourceDf)
+
+            if chunkFilter is not None:
+                sourceDf = chunkFilter(sourceDf)
+        else:
+            # filtered chunks drop their rows as they are read, only the kept rows are concatenated
+            chunks = []
+            for chunk in iterSourceChunks(schema=schema, dataPath=dataPath, columns=columns, chunkRows=chunkRows):
+                nRows += len(chunk)
+                chunks.append(chunk if chunkFilter is None else chunkFilter(chunk))
+
+            sourceDf = pd.concat(chunks, ignore_index=True)
+
+    # the footprint is the rss increase over the read's entry, so engines and sources compare directly
+    footprint = '' if stats['peakMemory'] is None else f", {stats['peakMemory'] / 2**20:,.1f} MiB peak rss increase"
+    print(
+        f"{schema['fileName']} ({readMode}): {nRows:,} rows read, {len(sourceDf):,} kept, "
+        f"{stats['wallTime']:.2f}s, {nRows / stats['wallTime']:,.0f} rows/s{footprint}"
+    )
+
+    return sourceDf
+
+
+def getCreditsDb(dataPath: str = DATA_PATH, titles: list = None):
+    # credits only matter for the movies they get merged into
+    chunkFilter = None if titles is None else lambda chunk: chunk.loc[chunk['title'].isin(titles)]
+    creditsDbDf = readSource(schema=CREDITS_SCHEMA, dataPath=dataPath, chunkFilter=chunkFilter)
 
     return creditsDbDf
 
 
-def getMoviesRawDf():
-    moviesRawFileName = 'movies_db.csv'
-    moviesRawDf = pd.read_csv(os.path.join(DATA_PATH, moviesRawFileName))
+def getMoviesRawDf(dataPath: str = DATA_PATH):
+    moviesRawDf = readSource(schema=MOVIES_SCHEMA, dataPath=dataPath)
 
     return moviesRawDf
 
 
-def getPJMEHourlyRawDf():
-    pjmeHourlyFileName = 'PJME_hourly.csv'
-    pjmeHourlyRawDf = pd.read_csv(os.path.join(DATA_PATH, pjmeHourlyFileName))
-    
-    return pjmeHourlyRawDf
+def getPJMHourlyRawDf(region: str = 'PJME', dataPath: str = DATA_PATH):
+    pjmHourlyRawDf = readSource(schema=getPJMHourlySchema(region=region), dataPath=dataPath)
+
+    return pjmHourlyRawDf
+
+def getDivorceData(dataPath: str = DATA_PATH):
+    divorceDataRawDf = readSource(schema=DIVORCE_SCHEMA, dataPath=dataPath)
 
-def getDivorceData():
-    divorceDataFileName = 'divorce_data.csv'
-    divorceDataRawDf = pd.read_csv(os.path.join(DATA_PATH, divorceDataFileName), sep=';')
-    
-    return divorceDataRawDf
\ No newline at end of file
+    return divorceDataRawDf
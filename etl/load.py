@@ -1,11 +1,31 @@
 import os
+import json
 import pickle
 import boto3
 
-import pandas as pd
+import numpy as np
+import scipy.sparse as sp
 
 from aws.s3 import uploadFile
-from etl.transform import createMoviesDatabase, createMovieDbSimilarityVectors, createAnalyticsMoviesDatabase, createXbgRegressionTrainObject, createDivorceDataModel
+from common.artifacts import writeParquet
+from common.engines import MOVIE_ENGINES, ExactEngine, IvfEngine
+from common.recommender import applyMovieCardsDelta
+from common.filters import applyFilterIndexDelta
+from common.search import createTitleSearchIndex
+from common.models import BOOSTER_FORMAT, getModelVersion, loadBooster
+from etl.similarity import (
+    createMovieDbTagVectors,
+    createIvfIndex,
+    createMovieDbNeighborIndex,
+    updateMovieDbTagVectors,
+    updateMovieDbNeighborIndex,
+)
+from etl.parsing import parseMovieDbTagColumns
+from etl.stemming import TokenStemmer
+from etl.backtest import runPJMEBacktest
+from etl.refresh import appendPJMERows, refreshPJMEBooster
+from etl.regions import getAvailableRegions, runPJMRegionTraining
+from etl.transform import PJM_REGIONS, createMoviesDatabase, createAnalyticsMoviesDatabase, createMovieCardsDatabase, createMovieDbFilterIndex, createPJMEDf, createXbgRegressionObject, createDivorceDataModel
 
 DATA_PATH = os.path.join(os.getcwd(), "data", "worked")
 BUCKET_FOLDER = 'worked'
@@ -15,41 +35,273 @@ def loadedInfoPrint(filename: str):
     print(f'Loaded {filename}!!')
 
 
-def loadWorkedMoviesDatabase(awsSession: boto3.Session):
+def storeMovieCatalogManifest(awsSession: boto3.Session, manifest: dict):
+    manifestFilename = 'movieCatalogManifest.json'
+    manifestPath = os.path.join(DATA_PATH, manifestFilename)
+    with open(manifestPath, 'w') as f:
+        json.dump(manifest, f)
+    uploadFile(awsSession=awsSession, filePath=manifestPath, s3Key=f'{BUCKET_FOLDER}/{manifestFilename}')
+    loadedInfoPrint(filename=manifestFilename)
+
+
+def createNeighborEngine(neighborEngine: str, vectors, ivfIndex: dict):
+    if neighborEngine == 'exact':
+        return ExactEngine(vectors=vectors)
+
+    if neighborEngine == 'ivf':
+        return IvfEngine(vectors=vectors, centroids=ivfIndex['centroids'], assignments=ivfIndex['assignments'])
+
+    raise ValueError(f'Unknown neighbor engine {neighborEngine}. Options: {MOVIE_ENGINES}')
+
+
+def loadWorkedMoviesDatabase(awsSession: boto3.Session, tagWeighting: str = 'count', neighborEngine: str = 'exact'):
+    stemmer = TokenStemmer()
+
     movieDb = createMoviesDatabase()
-    movieDbAnalytics = createAnalyticsMoviesDatabase(movieDb=movieDb)
-    similarityVectors = createMovieDbSimilarityVectors(movieDb=movieDbAnalytics)
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDb)
+    movieDbAnalytics = createAnalyticsMoviesDatabase(movieDb=movieDb, stemmer=stemmer, parsedDf=parsedDf)
+    movieCards = createMovieCardsDatabase(movieDb=movieDb, parsedDf=parsedDf)
+    filterIndex = createMovieDbFilterIndex(movieDb=movieDb, parsedDf=parsedDf)
+    voteCounts = movieDb['vote_count'].to_numpy()
+    titleSearchIndex = createTitleSearchIndex(titles=movieCards['title'].to_list(), voteCounts=voteCounts)
+    tagVectorizer, tagVectors = createMovieDbTagVectors(movieDb=movieDbAnalytics, weighting=tagWeighting)
+    ivfIndex = createIvfIndex(vectors=tagVectors)
+    engine = createNeighborEngine(neighborEngine=neighborEngine, vectors=tagVectors, ivfIndex=ivfIndex)
+    neighborIndex = createMovieDbNeighborIndex(vectors=tagVectors, engine=engine)
 
     # store data
-    movieDbFilename = 'movieDb.csv'
+    movieDbFilename = 'movieDb.parquet'
     movieDbPath = os.path.join(DATA_PATH, movieDbFilename)
-    movieDb.to_csv(movieDbPath)
+    writeParquet(df=movieDb, path=movieDbPath)
     uploadFile(awsSession=awsSession, filePath=movieDbPath, s3Key=f'{BUCKET_FOLDER}/{movieDbFilename}')
     loadedInfoPrint(filename=movieDbFilename)
 
-    movieDbAnalyticsFilename = 'movieDbAnalytics.csv'
+    movieDbAnalyticsFilename = 'movieDbAnalytics.parquet'
     movieDbAnalyticsPath = os.path.join(DATA_PATH, movieDbAnalyticsFilename)
-    movieDbAnalytics.to_csv(movieDbAnalyticsPath)
+    writeParquet(df=movieDbAnalytics, path=movieDbAnalyticsPath)
     uploadFile(
         awsSession=awsSession, filePath=movieDbAnalyticsPath, s3Key=f'{BUCKET_FOLDER}/{movieDbAnalyticsFilename}'
     )
     loadedInfoPrint(filename=movieDbAnalyticsFilename)
 
-    similarityVectorsFilename = 'similarityVectors.pkl'
-    similarityVectorsPath = os.path.join(DATA_PATH, similarityVectorsFilename)
-    with open(similarityVectorsPath, 'wb') as f:
-        pickle.dump(similarityVectors, f)
+    movieCardsFilename = 'movieCards.parquet'
+    movieCardsPath = os.path.join(DATA_PATH, movieCardsFilename)
+    writeParquet(df=movieCards, path=movieCardsPath)
+    uploadFile(awsSession=awsSession, filePath=movieCardsPath, s3Key=f'{BUCKET_FOLDER}/{movieCardsFilename}')
+    loadedInfoPrint(filename=movieCardsFilename)
+
+    neighborIndexFilename = 'movieNeighborIndex.npz'
+    neighborIndexPath = os.path.join(DATA_PATH, neighborIndexFilename)
+    np.savez(neighborIndexPath, **neighborIndex)
+    uploadFile(
+        awsSession=awsSession, filePath=neighborIndexPath, s3Key=f'{BUCKET_FOLDER}/{neighborIndexFilename}'
+    )
+    loadedInfoPrint(filename=neighborIndexFilename)
+
+    tagVectorsFilename = 'movieTagVectors.npz'
+    tagVectorsPath = os.path.join(DATA_PATH, tagVectorsFilename)
+    sp.save_npz(tagVectorsPath, tagVectors)
+    uploadFile(awsSession=awsSession, filePath=tagVectorsPath, s3Key=f'{BUCKET_FOLDER}/{tagVectorsFilename}')
+    loadedInfoPrint(filename=tagVectorsFilename)
+
+    filterIndexFilename = 'movieFilterIndex.npz'
+    filterIndexPath = os.path.join(DATA_PATH, filterIndexFilename)
+    np.savez(filterIndexPath, **filterIndex)
+    uploadFile(awsSession=awsSession, filePath=filterIndexPath, s3Key=f'{BUCKET_FOLDER}/{filterIndexFilename}')
+    loadedInfoPrint(filename=filterIndexFilename)
+
+    titleSearchIndexFilename = 'movieTitleSearchIndex.npz'
+    titleSearchIndexPath = os.path.join(DATA_PATH, titleSearchIndexFilename)
+    np.savez(titleSearchIndexPath, **titleSearchIndex)
     uploadFile(
-        awsSession=awsSession, filePath=similarityVectorsPath, s3Key=f'{BUCKET_FOLDER}/{similarityVectorsFilename}'
+        awsSession=awsSession, filePath=titleSearchIndexPath, s3Key=f'{BUCKET_FOLDER}/{titleSearchIndexFilename}'
+    )
+    loadedInfoPrint(filename=titleSearchIndexFilename)
+
+    ivfIndexFilename = 'movieIvfIndex.npz'
+    ivfIndexPath = os.path.join(DATA_PATH, ivfIndexFilename)
+    np.savez(ivfIndexPath, **ivfIndex)
+    uploadFile(awsSession=awsSession, filePath=ivfIndexPath, s3Key=f'{BUCKET_FOLDER}/{ivfIndexFilename}')
+    loadedInfoPrint(filename=ivfIndexFilename)
+
+    # local state reused by incremental catalog updates
+    movieCatalogState = {
+        'vectorizer': tagVectorizer,
+        'vectors': tagVectors,
+        'movieIds': movieDbAnalytics['id'].to_numpy(),
+        'ivfIndex': ivfIndex,
+        'stemmer': stemmer,
+        'neighborIndex': neighborIndex,
+        'movieCards': movieCards,
+        'filterIndex': filterIndex,
+        'voteCounts': voteCounts,
+    }
+    with open(os.path.join(DATA_PATH, 'movieCatalogState.pkl'), 'wb') as f:
+        pickle.dump(movieCatalogState, f)
+
+    # versions keep counting across full rebuilds, the page caches the catalog by version
+    version = 0
+    manifestPath = os.path.join(DATA_PATH, 'movieCatalogManifest.json')
+    if os.path.exists(manifestPath):
+        with open(manifestPath, 'r') as f:
+            version = json.load(f)['version'] + 1
+
+    # the page labels the precomputed neighbors after the engine that built them
+    storeMovieCatalogManifest(
+        awsSession=awsSession, manifest={'version': version, 'neighborEngine': neighborEngine, 'deltas': []}
     )
-    loadedInfoPrint(filename=similarityVectorsFilename)
 
     return
 
-def loadXbgPJMERegressionObject(awsSession: boto3.Session):
-    xbgPJMEObj = createXbgRegressionTrainObject()
+
+def loadMovieCatalogUpdate(awsSession: boto3.Session, dataPath: str, extendVocabulary: bool = False):
+    with open(os.path.join(DATA_PATH, 'movieCatalogState.pkl'), 'rb') as f:
+        movieCatalogState = pickle.load(f)
+    with open(os.path.join(DATA_PATH, 'movieCatalogManifest.json'), 'r') as f:
+        manifest = json.load(f)
+
+    movieDb = createMoviesDatabase(dataPath=dataPath).drop_duplicates(subset=['id'])
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDb)
+    movieDbAnalytics = createAnalyticsMoviesDatabase(
+        movieDb=movieDb, stemmer=movieCatalogState['stemmer'], parsedDf=parsedDf
+    )
+    movieCards = createMovieCardsDatabase(movieDb=movieDb, parsedDf=parsedDf)
+
+    movieCatalogState, tagVectorsDelta = updateMovieDbTagVectors(
+        movieTagModel=movieCatalogState, movieDb=movieDbAnalytics, extendVocabulary=extendVocabulary
+    )
+    neighborIndex, neighborIndexDelta = updateMovieDbNeighborIndex(
+        neighborIndex=movieCatalogState['neighborIndex'],
+        vectors=movieCatalogState['vectors'],
+        updatedRows=tagVectorsDelta['rows'],
+    )
+    movieCardsDelta = movieCards.assign(row=tagVectorsDelta['rows'])
+    filterIndexDelta = {
+        **createMovieDbFilterIndex(movieDb=movieDb, parsedDf=parsedDf),
+        'nMovies': tagVectorsDelta['nMovies'],
+        'rows': tagVectorsDelta['rows'],
+    }
+
+    movieCatalogState['neighborIndex'] = neighborIndex
+    movieCatalogState['movieCards'] = applyMovieCardsDelta(
+        movieCards=movieCatalogState['movieCards'], movieCardsDelta=movieCardsDelta
+    )
+    movieCatalogState['filterIndex'] = applyFilterIndexDelta(
+        filterIndex=movieCatalogState['filterIndex'], filterIndexDelta=filterIndexDelta
+    )
+
+    voteCounts = np.zeros(int(tagVectorsDelta['nMovies']), dtype=movieCatalogState['voteCounts'].dtype)
+    voteCounts[: len(movieCatalogState['voteCounts'])] = movieCatalogState['voteCounts']
+    voteCounts[tagVectorsDelta['rows']] = movieDb['vote_count'].to_numpy()
+    movieCatalogState['voteCounts'] = voteCounts
+
+    # the search index is small, updates republish it whole instead of a delta
+    titleSearchIndex = createTitleSearchIndex(
+        titles=movieCatalogState['movieCards']['title'].to_list(), voteCounts=voteCounts
+    )
+
+    # store data
+    version = manifest['version'] + 1
+
+    neighborIndexDeltaFilename = f'movieNeighborIndexDelta_{version}.npz'
+    neighborIndexDeltaPath = os.path.join(DATA_PATH, neighborIndexDeltaFilename)
+    np.savez(neighborIndexDeltaPath, **neighborIndexDelta)
+    uploadFile(
+        awsSession=awsSession, filePath=neighborIndexDeltaPath, s3Key=f'{BUCKET_FOLDER}/{neighborIndexDeltaFilename}'
+    )
+    loadedInfoPrint(filename=neighborIndexDeltaFilename)
+
+    movieCardsDeltaFilename = f'movieCardsDelta_{version}.parquet'
+    movieCardsDeltaPath = os.path.join(DATA_PATH, movieCardsDeltaFilename)
+    writeParquet(df=movieCardsDelta, path=movieCardsDeltaPath)
+    uploadFile(
+        awsSession=awsSession, filePath=movieCardsDeltaPath, s3Key=f'{BUCKET_FOLDER}/{movieCardsDeltaFilename}'
+    )
+    loadedInfoPrint(filename=movieCardsDeltaFilename)
+
+    tagVectorsDeltaFilename = f'movieTagVectorsDelta_{version}.npz'
+    tagVectorsDeltaPath = os.path.join(DATA_PATH, tagVectorsDeltaFilename)
+    np.savez(tagVectorsDeltaPath, **tagVectorsDelta)
+    uploadFile(
+        awsSession=awsSession, filePath=tagVectorsDeltaPath, s3Key=f'{BUCKET_FOLDER}/{tagVectorsDeltaFilename}'
+    )
+    loadedInfoPrint(filename=tagVectorsDeltaFilename)
+
+    filterIndexDeltaFilename = f'movieFilterIndexDelta_{version}.npz'
+    filterIndexDeltaPath = os.path.join(DATA_PATH, filterIndexDeltaFilename)
+    np.savez(filterIndexDeltaPath, **filterIndexDelta)
+    uploadFile(
+        awsSession=awsSession, filePath=filterIndexDeltaPath, s3Key=f'{BUCKET_FOLDER}/{filterIndexDeltaFilename}'
+    )
+    loadedInfoPrint(filename=filterIndexDeltaFilename)
+
+    titleSearchIndexFilename = f'movieTitleSearchIndex_{version}.npz'
+    titleSearchIndexPath = os.path.join(DATA_PATH, titleSearchIndexFilename)
+    np.savez(titleSearchIndexPath, **titleSearchIndex)
+    uploadFile(
+        awsSession=awsSession, filePath=titleSearchIndexPath, s3Key=f'{BUCKET_FOLDER}/{titleSearchIndexFilename}'
+    )
+    loadedInfoPrint(filename=titleSearchIndexFilename)
+
+    with open(os.path.join(DATA_PATH, 'movieCatalogState.pkl'), 'wb') as f:
+        pickle.dump(movieCatalogState, f)
+
+    # the manifest goes last, so the page never sees a partially published delta
+    manifest = {
+        'version': version,
+        'neighborEngine': manifest.get('neighborEngine', 'exact'),
+        'deltas': [
+            *manifest['deltas'],
+            {
+                'neighborIndex': neighborIndexDeltaFilename,
+                'movieCards': movieCardsDeltaFilename,
+                'tagVectors': tagVectorsDeltaFilename,
+                'filterIndex': filterIndexDeltaFilename,
+                'titleSearch': titleSearchIndexFilename,
+            },
+        ],
+    }
+    storeMovieCatalogManifest(awsSession=awsSession, manifest=manifest)
+
+    return
+
+
+def storePJMRegionsManifest(awsSession: boto3.Session, regions: list):
+    pjmRegionsFilename = 'pjmRegions.json'
+    pjmRegionsPath = os.path.join(DATA_PATH, pjmRegionsFilename)
+
+    # regions trained by earlier runs keep their published objects
+    if os.path.exists(pjmRegionsPath):
+        with open(pjmRegionsPath, 'r') as f:
+            regions = set(regions) | set(json.load(f)['regions'])
+
+    with open(pjmRegionsPath, 'w') as f:
+        json.dump({'regions': [region for region in PJM_REGIONS if region in regions]}, f)
+
+    uploadFile(awsSession=awsSession, filePath=pjmRegionsPath, s3Key=f'{BUCKET_FOLDER}/{pjmRegionsFilename}')
+    loadedInfoPrint(filename=pjmRegionsFilename)
+
+    return
+
+
+def storeXbgPJMEObject(awsSession: boto3.Session, xbgPJMEObj: dict):
+    region = xbgPJMEObj['region']
+
+    # the booster ships in xgboost's native format, named after its content so caches key on it
+    modelBytes = xbgPJMEObj.pop('model').save_raw(raw_format=BOOSTER_FORMAT)
+    modelVersion = getModelVersion(modelBytes=modelBytes)
+
+    modelFilename = f'xbg{region}Model_{modelVersion}.{BOOSTER_FORMAT}'
+    modelPath = os.path.join(DATA_PATH, modelFilename)
+    with open(modelPath, 'wb') as f:
+        f.write(modelBytes)
+    uploadFile(awsSession=awsSession, filePath=modelPath, s3Key=f'{BUCKET_FOLDER}/{modelFilename}')
+    loadedInfoPrint(filename=modelFilename)
+
+    xbgPJMEObj['modelVersion'] = modelVersion
+    xbgPJMEObj['modelFilename'] = modelFilename
     
-    xbgPJMEObjFilename = 'xbgPJMEObj.pkl'
+    xbgPJMEObjFilename = f'xbg{region}Obj.pkl'
     xbgPJMEObjPath = os.path.join(DATA_PATH, xbgPJMEObjFilename)
     with open(xbgPJMEObjPath, 'wb') as f:
         pickle.dump(xbgPJMEObj, f)
@@ -58,7 +310,78 @@ def loadXbgPJMERegressionObject(awsSession: boto3.Session):
         awsSession=awsSession, filePath=xbgPJMEObjPath, s3Key=f'{BUCKET_FOLDER}/{xbgPJMEObjFilename}'
     )
     loadedInfoPrint(filename=xbgPJMEObjFilename)
-    
+
+    return
+
+
+def loadXbgPJMRegionObjects(
+    awsSession: boto3.Session, regions: list = None, trainingMode: str = 'sklearn', nWorkers: int = None, nThreads: int = None
+):
+    regions = getAvailableRegions(regions=regions)
+
+    # one booster per region, trained concurrently on the shared feature pipeline
+    xbgRegionObjs = runPJMRegionTraining(regions=regions, trainingMode=trainingMode, nWorkers=nWorkers, nThreads=nThreads)
+
+    for xbgRegionObj in xbgRegionObjs:
+        storeXbgPJMEObject(awsSession=awsSession, xbgPJMEObj=xbgRegionObj)
+
+    storePJMRegionsManifest(awsSession=awsSession, regions=regions)
+
+    return
+
+def loadXbgPJMERegressionUpdate(
+    awsSession: boto3.Session, dataPath: str, refreshMode: str = 'continue', nThreads: int = None, region: str = 'PJME'
+):
+    with open(os.path.join(DATA_PATH, f'xbg{region}Obj.pkl'), 'rb') as f:
+        xbgPJMEObj = pickle.load(f)
+    with open(os.path.join(DATA_PATH, xbgPJMEObj['modelFilename']), 'rb') as f:
+        booster = loadBooster(modelBytes=f.read())
+
+    pjmeDf, nNewRows = appendPJMERows(
+        pjmeDf=xbgPJMEObj['data'].drop(columns=['prediction']), newPjmeDf=createPJMEDf(dataPath=dataPath, region=region)
+    )
+    if nNewRows == 0:
+        print(f"No {region} hours after {xbgPJMEObj['data'].index[-1]}, model {xbgPJMEObj['modelVersion']} stays!!")
+        return
+
+    booster, refreshReport = refreshPJMEBooster(
+        booster=booster, pjmeDf=pjmeDf, target=xbgPJMEObj['target'], mode=refreshMode, nThreads=nThreads
+    )
+    print(
+        f"{nNewRows:,} new hours, {refreshMode} refresh validation rmse {refreshReport['rmse']:,.2f} MW "
+        f"(served model {refreshReport['baseRmse']:,.2f} MW)"
+    )
+
+    # a refresh that does worse than the served booster on the held out hours is not published
+    if not refreshReport['accepted']:
+        print(f"Refresh rejected, model {xbgPJMEObj['modelVersion']} stays!!")
+        return
+
+    refreshReport['baseVersion'] = xbgPJMEObj['modelVersion']
+    refreshReport['newRows'] = nNewRows
+
+    # the refreshed booster has seen hours past the original split, its test data starts at the held out hours
+    updatedXbgPJMEObj = createXbgRegressionObject(
+        pjmeDf=pjmeDf, booster=booster, splitDate=refreshReport['validationStart'], region=region
+    )
+    updatedXbgPJMEObj['refresh'] = refreshReport
+    storeXbgPJMEObject(awsSession=awsSession, xbgPJMEObj=updatedXbgPJMEObj)
+
+    return
+
+def loadPJMEBacktest(awsSession: boto3.Session, mode: str = 'expanding', nWorkers: int = None, nThreads: int = None):
+    foldMetrics, horizonMetrics = runPJMEBacktest(mode=mode, nWorkers=nWorkers, nThreads=nThreads)
+
+    pjmeBacktestFilename = 'pjmeBacktest.pkl'
+    pjmeBacktestPath = os.path.join(DATA_PATH, pjmeBacktestFilename)
+    with open(pjmeBacktestPath, 'wb') as f:
+        pickle.dump({'mode': mode, 'folds': foldMetrics, 'horizons': horizonMetrics}, f)
+
+    uploadFile(
+        awsSession=awsSession, filePath=pjmeBacktestPath, s3Key=f'{BUCKET_FOLDER}/{pjmeBacktestFilename}'
+    )
+    loadedInfoPrint(filename=pjmeBacktestFilename)
+
     return
 
 def loadDiverceMlObject(awsSession: boto3.Session):
@@ -73,5 +396,15 @@ def loadDiverceMlObject(awsSession: boto3.Session):
         awsSession=awsSession, filePath=divorceMlObjPath, s3Key=f'{BUCKET_FOLDER}/{divorceMlObjFilename}'
     )
     loadedInfoPrint(filename=divorceMlObjFilename)
+
+    divorceScorerFilename = 'divorceScorer.json'
+    divorceScorerPath = os.path.join(DATA_PATH, divorceScorerFilename)
+    with open(divorceScorerPath, 'w') as f:
+        json.dump(divorceMlObj['scorer'], f)
+
+    uploadFile(
+        awsSession=awsSession, filePath=divorceScorerPath, s3Key=f'{BUCKET_FOLDER}/{divorceScorerFilename}'
+    )
+    loadedInfoPrint(filename=divorceScorerFilename)
     
     return
\ No newline at end of file
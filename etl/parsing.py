@@ -0,0 +1,122 @@
+import ast
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+TAG_COLUMNS = ['genres', 'keywords', 'cast', 'crew']
+CARD_COLUMNS = ['director', 'cardCast', 'genreNames']
+MOVIE_CARD_CAST_SIZE = 6
+PARSE_CHUNK_SIZE = 256
+
+
+def parseStrListObj(obj: str):
+    # TMDB payloads are JSON, python reprs (single quotes, None) still go through literal_eval
+    try:
+        return json.loads(obj)
+    except ValueError:
+        return ast.literal_eval(obj)
+
+
+def extractAttributeFromStrListObj(obj: str, attrName: str, limit: int = None):
+    if not isinstance(obj, str):
+        return
+
+    objList = parseStrListObj(obj)
+
+    returnList = []
+
+    for idx, objItem in enumerate(objList):
+        if attrName not in objItem:
+            continue
+
+        if isinstance(limit, int) and not limit > idx:
+            break
+
+        returnList.append(str(objItem[attrName]).replace(" ", "").lower())
+
+    return returnList
+
+
+def getMainCrewMembersFromStrListObj(obj: str, jobs: list = ['Writer', 'Director']):
+    if not isinstance(obj, str):
+        return
+
+    objList = parseStrListObj(obj)
+
+    returnList = []
+
+    for objItem in objList:
+        if len(returnList) == len(jobs):
+            break
+
+        job = objItem['job']
+
+        if job not in jobs:
+            continue
+
+        returnList.append(objItem['name'].replace(" ", "").lower())
+
+    return returnList
+
+
+def getNamesFromStrListObj(obj: str, limit: int = None):
+    if not isinstance(obj, str):
+        return []
+
+    objList = parseStrListObj(obj)
+
+    return [objItem['name'] for objItem in objList[:limit] if 'name' in objItem]
+
+
+def getDirectorFromStrListObj(obj: str):
+    if not isinstance(obj, str):
+        return ''
+
+    objList = parseStrListObj(obj)
+
+    for objItem in objList:
+        if objItem.get('job') == 'Director':
+            return objItem['name']
+
+    return ''
+
+
+def parseTagColumnsChunk(rows: list):
+    parsedRows = []
+
+    # card fields come out of the same pass, each payload is decoded once per worker
+    for genres, keywords, cast, crew in rows:
+        parsedRows.append(
+            (
+                extractAttributeFromStrListObj(obj=genres, attrName='name'),
+                extractAttributeFromStrListObj(obj=keywords, attrName='name'),
+                extractAttributeFromStrListObj(obj=cast, attrName='name', limit=5),
+                getMainCrewMembersFromStrListObj(obj=crew),
+                getDirectorFromStrListObj(obj=crew),
+                getNamesFromStrListObj(obj=cast, limit=MOVIE_CARD_CAST_SIZE),
+                getNamesFromStrListObj(obj=genres),
+            )
+        )
+
+    return parsedRows
+
+
+def parseMovieDbTagColumns(movieDb: pd.DataFrame, nWorkers: int = None, chunkSize: int = PARSE_CHUNK_SIZE):
+    nWorkers = nWorkers or os.cpu_count()
+
+    rows = list(movieDb[TAG_COLUMNS].itertuples(index=False, name=None))
+    chunks = [rows[start:start + chunkSize] for start in range(0, len(rows), chunkSize)]
+
+    if nWorkers == 1 or len(chunks) <= 1:
+        parsedChunks = map(parseTagColumnsChunk, chunks)
+        parsedRows = [parsedRow for parsedChunk in parsedChunks for parsedRow in parsedChunk]
+    else:
+        with ProcessPoolExecutor(max_workers=nWorkers) as executor:
+            parsedChunks = executor.map(parseTagColumnsChunk, chunks)
+            parsedRows = [parsedRow for parsedChunk in parsedChunks for parsedRow in parsedChunk]
+
+    parsedDf = pd.DataFrame(parsedRows, columns=[*TAG_COLUMNS, *CARD_COLUMNS], index=movieDb.index)
+
+    return parsedDf
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ru_maxrss is reported in bytes on macOS and in KiB everywhere else
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 2**10
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# absolute peaks of the blocks still open, an inner block resets the high-water mark the outer ones rely on
+openBlockPeaks = []
+
+
+def getCurrentRss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+def resetPeakRss():
+    # linux resets VmHWM to the current rss, other platforms keep the lifetime high-water mark
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+
+    return True
+
+
+def getPeakRss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 2**10
+    except OSError:
+        pass
+
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT
+
+
+def getLargestChildPeakRss():
+    # only the largest reaped child is reported, not the sum of a pool
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * MAXRSS_UNIT
+
+
+@contextmanager
+def trackResources(label: str, report: bool = True):
+    stats = {'wallTime': None, 'peakMemory': None, 'childrenPeakMemory': None}
+
+    # the peak reached so far belongs to the enclosing blocks before it is reset
+    if len(openBlockPeaks) > 0:
+        openBlockPeaks[-1] = max(openBlockPeaks[-1], getPeakRss() or 0)
+
+    startRss = getCurrentRss()
+    resetPeakRss()
+    openBlockPeaks.append(0)
+    startTime = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats['wallTime'] = time.perf_counter() - startTime
+        peakRss = max(openBlockPeaks.pop(), getPeakRss() or 0)
+        if len(openBlockPeaks) > 0:
+            openBlockPeaks[-1] = max(openBlockPeaks[-1], peakRss)
+
+        # the block's own footprint, memory held before it started is not counted
+        if startRss is not None and peakRss > 0:
+            stats['peakMemory'] = max(peakRss - startRss, 0)
+        stats['childrenPeakMemory'] = getLargestChildPeakRss()
+
+        memoryReport = [
+            f"{stats['peakMemory'] / 2**20:,.1f} MiB peak rss increase" if stats['peakMemory'] is not None else None,
+            f"{stats['childrenPeakMemory'] / 2**20:,.1f} MiB largest child peak" if stats['childrenPeakMemory'] else None,
+        ]
+        if report:
+            print(', '.join([f"{label}: {stats['wallTime']:.2f}s wall time", *filter(None, memoryReport)]))
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from etl.training import PJME_EARLY_STOPPING, PJME_TRAINING_PARAMS, PJME_TRAINING_ROUNDS, TRAINING_REPORT_PERIOD, TrainingReport
+from etl.transform import PJME_TARGET
+
+REFRESH_MODES = ['continue', 'sliding']
+REFRESH_WINDOW_DAYS = {'continue': 365, 'sliding': 5 * 365}
+REFRESH_VALIDATION_DAYS = 30
+REFRESH_CONTINUE_ROUNDS = 500
+REFRESH_RMSE_TOLERANCE = 0.02
+
+
+def appendPJMERows(pjmeDf: pd.DataFrame, newPjmeDf: pd.DataFrame):
+    # append only, hours already in the artifact are never rewritten
+    newPjmeDf = newPjmeDf.loc[newPjmeDf.index > pjmeDf.index[-1]]
+    newPjmeDf = newPjmeDf.loc[~newPjmeDf.index.duplicated(keep='first')]
+
+    return pd.concat([pjmeDf, newPjmeDf[pjmeDf.columns]]), len(newPjmeDf)
+
+
+def getBoosterRmse(booster: xgb.Booster, features: np.ndarray, target: np.ndarray):
+    errors = booster.inplace_predict(features).astype(np.float64) - target
+
+    return float(np.sqrt(np.mean(errors**2)))
+
+
+def refreshPJMEBooster(
+    booster: xgb.Booster, pjmeDf: pd.DataFrame, target: str = PJME_TARGET, mode: str = 'continue', nThreads: int = None
+):
+    if mode not in REFRESH_MODES:
+        raise ValueError(f'Unknown refresh mode {mode}. Options: {REFRESH_MODES}')
+
+    nThreads = nThreads or os.cpu_count()
+
+    # the last days are held out, both boosters are judged on the same unseen hours
+    validationTimestamp = pjmeDf.index[-1] - pd.Timedelta(days=REFRESH_VALIDATION_DAYS)
+    trainStart = pjmeDf.index.searchsorted(validationTimestamp - pd.Timedelta(days=REFRESH_WINDOW_DAYS[mode]), side='left')
+    validationStart = pjmeDf.index.searchsorted(validationTimestamp, side='right')
+
+    features = pjmeDf[booster.feature_names].to_numpy(dtype=np.float32)
+    target = pjmeDf[target].to_numpy(dtype=np.float32)
+    trainRows = slice(trainStart, validationStart)
+    validationRows = slice(validationStart, len(pjmeDf))
+
+    dtrain = xgb.QuantileDMatrix(
+        features[trainRows], label=target[trainRows], feature_names=booster.feature_names, nthread=nThreads
+    )
+    dvalidation = xgb.QuantileDMatrix(
+        features[validationRows], label=target[validationRows], feature_names=booster.feature_names, ref=dtrain, nthread=nThreads
+    )
+
+    # continue adds trees to a copy of the served booster, sliding refits from scratch on the recent window
+    candidateBooster = xgb.train(
+        params={**PJME_TRAINING_PARAMS, 'nthread': nThreads},
+        dtrain=dtrain,
+        num_boost_round=REFRESH_CONTINUE_ROUNDS if mode == 'continue' else PJME_TRAINING_ROUNDS,
+        evals=[(dvalidation, 'validation')],
+        early_stopping_rounds=PJME_EARLY_STOPPING,
+        verbose_eval=TRAINING_REPORT_PERIOD,
+        xgb_model=booster if mode == 'continue' else None,
+        callbacks=[TrainingReport(nRows=dtrain.num_row())],
+    )
+    candidateBooster = candidateBooster[: candidateBooster.best_iteration + 1]
+
+    baseRmse = getBoosterRmse(booster=booster, features=features[validationRows], target=target[validationRows])
+    candidateRmse = getBoosterRmse(booster=candidateBooster, features=features[validationRows], target=target[validationRows])
+
+    refreshReport = {
+        'mode': mode,
+        # bounds of the hours the candidate was fitted on, the held out hours start at validationStart
+        'trainStart': str(pjmeDf.index[trainStart]),
+        'validationStart': str(pjmeDf.index[validationStart]),
+        'trainRows': validationStart - trainStart,
+        'validationRows': len(pjmeDf) - validationStart,
+        'baseRounds': booster.num_boosted_rounds(),
+        'rounds': candidateBooster.num_boosted_rounds(),
+        'baseRmse': baseRmse,
+        'rmse': candidateRmse,
+        'accepted': candidateRmse <= baseRmse * (1 + REFRESH_RMSE_TOLERANCE),
+    }
+
+    return candidateBooster, refreshReport
@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from etl.extract import DATA_PATH, extractOptions, setExtractOptions
+from etl.profiling import trackResources
+from etl.training import getPoolSizes
+from etl.transform import PJM_REGIONS, createXbgRegressionTrainObject
+
+
+def getAvailableRegions(regions: list = None, dataPath: str = DATA_PATH):
+    availableRegions = []
+
+    for region in regions or PJM_REGIONS:
+        if os.path.exists(os.path.join(dataPath, f'{region}_hourly.csv')):
+            availableRegions.append(region)
+        else:
+            print(f'No {region}_hourly.csv in {dataPath}, skipping {region}!!')
+
+    return availableRegions
+
+
+def trainRegionObject(region: str, trainingMode: str, nThreads: int):
+    return createXbgRegressionTrainObject(trainingMode=trainingMode, nThreads=nThreads, region=region)
+
+
+def runPJMRegionTraining(regions: list, trainingMode: str = 'sklearn', nWorkers: int = None, nThreads: int = None):
+    nWorkers, nThreads = getPoolSizes(nTasks=len(regions), nWorkers=nWorkers, nThreads=nThreads)
+    trainRegion = partial(trainRegionObject, trainingMode=trainingMode, nThreads=nThreads)
+
+    with trackResources(label=f'PJM regions training ({len(regions)} regions, {nWorkers} workers x {nThreads} threads)'):
+        if nWorkers == 1:
+            xbgObjects = list(map(trainRegion, regions))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=nWorkers, initializer=setExtractOptions, initargs=(extractOptions['engine'], extractOptions['chunkRows'])
+            ) as executor:
+                xbgObjects = list(executor.map(trainRegion, regions))
+
+    return xbgObjects
@@ -0,0 +1,271 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from common.engines import ExactEngine, applyTagVectorsDelta, applyIvfAssignmentsDelta
+from common.recommender import selectTopN
+from etl.profiling import trackResources
+
+MOVIE_NEIGHBORS = 50
+TAG_MAX_FEATURES = 10000
+TAG_MAX_NEW_TERMS = 500
+TAG_WEIGHTINGS = ['count', 'tfidf']
+IVF_ITERATIONS = 10
+IVF_SAMPLE_SIZE = 100000
+
+
+def createTagVectorizer(weighting: str = 'count', maxFeatures: int = TAG_MAX_FEATURES):
+    if weighting == 'count':
+        return CountVectorizer(max_features=maxFeatures, stop_words='english', dtype=np.float32)
+
+    if weighting == 'tfidf':
+        # rows are L2 normalized afterwards, for both weightings alike
+        return TfidfVectorizer(max_features=maxFeatures, stop_words='english', dtype=np.float32, norm=None)
+
+    raise ValueError(f'Unknown tag weighting {weighting}. Options: {TAG_WEIGHTINGS}')
+
+
+def createMovieDbTagVectors(movieDb: pd.DataFrame, weighting: str = 'count', maxFeatures: int = TAG_MAX_FEATURES):
+    with trackResources(label=f'Tag vectorization ({weighting})'):
+        vectorizer = createTagVectorizer(weighting=weighting, maxFeatures=maxFeatures)
+
+        # CSR rows with unit norm, so a sparse dot product is the cosine similarity
+        vectors = vectorizer.fit_transform(movieDb['tags'])
+        vectors = normalize(vectors, norm='l2', copy=False)
+
+    return vectorizer, vectors
+
+
+def transformMovieDbTagVectors(vectorizer, movieDb: pd.DataFrame):
+    vectors = vectorizer.transform(movieDb['tags'])
+    vectors = normalize(vectors, norm='l2', copy=False)
+
+    return vectors
+
+
+def extendTagVocabulary(vectorizer, tags: list, nMovies: int, maxNewTerms: int = TAG_MAX_NEW_TERMS):
+    analyzer = vectorizer.build_analyzer()
+    documentFrequency = Counter(term for text in tags for term in set(analyzer(text)))
+
+    newTerms = [term for term, _ in documentFrequency.most_common() if term not in vectorizer.vocabulary_]
+    newTerms = newTerms[:maxNewTerms]
+
+    # new terms are appended as new columns, so previously computed vectors keep their layout
+    nTerms = len(vectorizer.vocabulary_)
+    for offset, term in enumerate(newTerms):
+        vectorizer.vocabulary_[term] = nTerms + offset
+
+    if isinstance(vectorizer, TfidfVectorizer) and len(newTerms) > 0:
+        newTermsFrequency = np.array([documentFrequency[term] for term in newTerms])
+        newTermsIdf = np.log((1 + nMovies) / (1 + newTermsFrequency)) + 1
+        vectorizer.idf_ = np.concatenate([vectorizer.idf_, newTermsIdf])
+        # the inner transformer validates the input width it was fitted with
+        vectorizer._tfidf.n_features_in_ = len(vectorizer.vocabulary_)
+
+    return newTerms
+
+
+def updateMovieDbTagVectors(
+    movieTagModel: dict, movieDb: pd.DataFrame, extendVocabulary: bool = False, maxNewTerms: int = TAG_MAX_NEW_TERMS
+):
+    vectorizer = movieTagModel['vectorizer']
+    vectors = movieTagModel['vectors']
+    movieIds = movieTagModel['movieIds']
+
+    # changed movies keep their catalog row, new movies are appended after the current catalog
+    movieRows = pd.Series(np.arange(len(movieIds)), index=movieIds)
+    movieRows = movieRows.loc[~movieRows.index.duplicated()]
+
+    batchRows = movieRows.reindex(movieDb['id']).to_numpy()
+    isNewMovie = np.isnan(batchRows)
+    batchRows[isNewMovie] = len(movieIds) + np.arange(isNewMovie.sum())
+    batchRows = batchRows.astype(np.int32)
+
+    nMovies = len(movieIds) + isNewMovie.sum()
+
+    with trackResources(label=f'Tag vectors update ({len(movieDb):,} movies, {isNewMovie.sum():,} new)'):
+        if extendVocabulary:
+            newTerms = extendTagVocabulary(
+                vectorizer=vectorizer, tags=movieDb['tags'], nMovies=nMovies, maxNewTerms=maxNewTerms
+            )
+            print(f'Tag vocabulary extended with {len(newTerms):,} terms')
+
+        batchVectors = transformMovieDbTagVectors(vectorizer=vectorizer, movieDb=movieDb)
+
+        tagVectorsDelta = {
+            'nMovies': np.int32(nMovies),
+            'rows': batchRows,
+            'data': batchVectors.data,
+            'indices': batchVectors.indices,
+            'indptr': batchVectors.indptr,
+            'shape': np.array(batchVectors.shape),
+            'assignments': assignToCentroids(vectors=batchVectors, centroids=movieTagModel['ivfIndex']['centroids']),
+        }
+
+    updatedMovieTagModel = {
+        **movieTagModel,
+        'vectors': applyTagVectorsDelta(vectors=vectors, tagVectorsDelta=tagVectorsDelta),
+        'movieIds': np.concatenate([movieIds, movieDb['id'].to_numpy()[isNewMovie]]),
+        'ivfIndex': {
+            'centroids': movieTagModel['ivfIndex']['centroids'],
+            'assignments': applyIvfAssignmentsDelta(
+                assignments=movieTagModel['ivfIndex']['assignments'], tagVectorsDelta=tagVectorsDelta
+            ),
+        },
+    }
+
+    return updatedMovieTagModel, tagVectorsDelta
+
+
+def assignToCentroids(vectors, centroids: np.ndarray, blockSize: int = 4096):
+    centroidsT = np.zeros((vectors.shape[1], centroids.shape[0]), dtype=np.float32)
+    centroidsT[: centroids.shape[1]] = centroids.T
+
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], blockSize):
+        assignments[start:start + blockSize] = np.asarray(vectors[start:start + blockSize] @ centroidsT).argmax(axis=1)
+
+    return assignments
+
+
+def createIvfIndex(
+    vectors, nLists: int = None, nIterations: int = IVF_ITERATIONS, sampleSize: int = IVF_SAMPLE_SIZE, seed: int = 0
+):
+    nMovies = vectors.shape[0]
+    nLists = nLists or max(1, int(np.sqrt(nMovies)))
+    rng = np.random.default_rng(seed)
+
+    with trackResources(label=f'IVF index ({nMovies:,} movies, {nLists:,} lists)'):
+        # spherical k-means over a sample, centroids stay unit norm like the tag vectors
+        sample = vectors[rng.choice(nMovies, size=min(nMovies, sampleSize), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nLists, replace=False)].toarray()
+
+        for _ in range(nIterations):
+            sampleAssignments = assignToCentroids(vectors=sample, centroids=centroids)
+            membership = sp.csr_matrix(
+                (np.ones(sample.shape[0], dtype=np.float32), (sampleAssignments, np.arange(sample.shape[0]))),
+                shape=(nLists, sample.shape[0]),
+            )
+
+            centroidSums = np.asarray((membership @ sample).todense())
+            centroidNorms = np.linalg.norm(centroidSums, axis=1, keepdims=True)
+            # empty lists keep their previous centroid
+            centroids = np.where(centroidNorms > 0, centroidSums / np.maximum(centroidNorms, 1e-12), centroids)
+
+        centroids = centroids.astype(np.float32)
+        assignments = assignToCentroids(vectors=vectors, centroids=centroids)
+
+    ivfIndex = {
+        'centroids': centroids,
+        'assignments': assignments,
+    }
+
+    return ivfIndex
+
+
+def createMovieDbNeighborIndex(vectors, nNeighbors: int = MOVIE_NEIGHBORS, engine=None, blockSize: int = 256):
+    nMovies = vectors.shape[0]
+    nNeighbors = min(nNeighbors, nMovies - 1)
+    engine = engine or ExactEngine(vectors=vectors, blockSize=blockSize)
+
+    neighborIndexes = np.empty((nMovies, nNeighbors), dtype=np.int32)
+    neighborScores = np.empty((nMovies, nNeighbors), dtype=np.float32)
+
+    with trackResources(label=f'Neighbor index ({nMovies:,} movies, top {nNeighbors}, {type(engine).__name__})'):
+        # similarity rows are computed one block at a time, so only blockSize x N scores live in memory
+        for start in range(0, nMovies, blockSize):
+            rows = np.arange(start, min(start + blockSize, nMovies))
+
+            neighborIndexes[rows], neighborScores[rows] = engine.search(
+                queryVectors=vectors[rows], n=nNeighbors, excludeRows=rows
+            )
+
+    neighborIndex = {
+        'indexes': neighborIndexes,
+        'scores': neighborScores,
+    }
+
+    return neighborIndex
+
+
+def updateMovieDbNeighborIndex(neighborIndex: dict, vectors, updatedRows: np.ndarray, blockSize: int = 256):
+    nMovies = vectors.shape[0]
+    nPreviousMovies, nNeighbors = neighborIndex['indexes'].shape
+
+    updatedRows = np.unique(updatedRows)
+    isUpdated = np.zeros(nMovies, dtype=bool)
+    isUpdated[updatedRows] = True
+
+    neighborIndexes = np.zeros((nMovies, nNeighbors), dtype=np.int32)
+    neighborScores = np.full((nMovies, nNeighbors), -np.inf, dtype=np.float32)
+    neighborIndexes[:nPreviousMovies] = neighborIndex['indexes']
+    neighborScores[:nPreviousMovies] = neighborIndex['scores']
+
+    # neighbors pointing to updated movies carry outdated scores, they compete again below
+    # approximate engines pad rows with -1, those slots point at no movie
+    previousKthScores = neighborScores[:, -1].copy()
+    isOutdatedNeighbor = (neighborIndexes >= 0) & isUpdated[np.maximum(neighborIndexes, 0)]
+    hasOutdatedNeighbor = isOutdatedNeighbor.any(axis=1) & ~isUpdated
+    neighborScores[isOutdatedNeighbor] = -np.inf
+
+    outdatedRows = np.flatnonzero(hasOutdatedNeighbor)
+    order = np.argsort(-neighborScores[outdatedRows], axis=1, kind='stable')
+    neighborIndexes[outdatedRows] = np.take_along_axis(neighborIndexes[outdatedRows], order, axis=1)
+    neighborScores[outdatedRows] = np.take_along_axis(neighborScores[outdatedRows], order, axis=1)
+
+    isTouched = isUpdated.copy()
+
+    with trackResources(label=f'Neighbor index update ({len(updatedRows):,} of {nMovies:,} movies)'):
+        engine = ExactEngine(vectors=vectors, blockSize=blockSize)
+
+        for start in range(0, len(updatedRows), blockSize):
+            rows = updatedRows[start:start + blockSize]
+            blockScores = engine.scoreBlock(queryVectors=vectors[rows], excludeRows=rows)
+
+            neighborIndexes[rows], neighborScores[rows] = selectTopN(scores=blockScores, n=nNeighbors)
+
+            # the block also holds the new columns of every other row, merged only where they beat the kth neighbor
+            mergeRows = np.flatnonzero(~isUpdated & (blockScores.max(axis=0) > neighborScores[:, -1]))
+            if len(mergeRows) == 0:
+                continue
+
+            candidateIndexes = np.hstack(
+                [neighborIndexes[mergeRows], np.broadcast_to(rows.astype(np.int32), (len(mergeRows), len(rows)))]
+            )
+            candidateScores = np.hstack([neighborScores[mergeRows], blockScores[:, mergeRows].T])
+
+            topPositions, neighborScores[mergeRows] = selectTopN(scores=candidateScores, n=nNeighbors)
+            neighborIndexes[mergeRows] = np.take_along_axis(candidateIndexes, topPositions, axis=1)
+            isTouched[mergeRows] = True
+
+        # rows whose updated neighbors dropped below the previous kth score may miss movies outside the stored list
+        staleRows = np.flatnonzero(hasOutdatedNeighbor & (neighborScores[:, -1] < previousKthScores))
+
+        for start in range(0, len(staleRows), blockSize):
+            rows = staleRows[start:start + blockSize]
+
+            neighborIndexes[rows], neighborScores[rows] = engine.search(
+                queryVectors=vectors[rows], n=nNeighbors, excludeRows=rows
+            )
+
+        isTouched[staleRows] = True
+
+    updatedNeighborIndex = {
+        'indexes': neighborIndexes,
+        'scores': neighborScores,
+    }
+
+    touchedRows = np.flatnonzero(isTouched).astype(np.int32)
+    neighborIndexDelta = {
+        'nMovies': np.int32(nMovies),
+        'rows': touchedRows,
+        'indexes': neighborIndexes[touchedRows],
+        'scores': neighborScores[touchedRows],
+    }
+
+    return updatedNeighborIndex, neighborIndexDelta
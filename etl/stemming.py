@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+from nltk.stem.porter import PorterStemmer
+
+STEM_CACHE_SIZE = 2**18
+
+
+class TokenStemmer:
+    def __init__(self, cacheSize: int = STEM_CACHE_SIZE) -> None:
+        self.stemmer = PorterStemmer()
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+
+    def stemToken(self, token: str):
+        if token in self.cache:
+            self.cache.move_to_end(token)
+            return self.cache[token]
+
+        tokenStem = self.stemmer.stem(token)
+
+        self.cache[token] = tokenStem
+        if len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)
+
+        return tokenStem
+
+    def stemTexts(self, texts: list):
+        tokenLists = [text.split() for text in texts]
+        vocabulary = {token for tokens in tokenLists for token in tokens}
+
+        # every unique token hits the stemmer at most once, texts are then mapped through the lookup
+        stems = {token: self.stemToken(token) for token in vocabulary}
+        stemmedTexts = [' '.join([stems[token] for token in tokens]) for tokens in tokenLists]
+
+        return stemmedTexts
@@ -0,0 +1,122 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+TRAINING_MODES = ['sklearn', 'quantile']
+PJME_TRAINING_PARAMS = {'objective': 'reg:squarederror', 'eta': 0.01, 'tree_method': 'hist'}
+PJME_TRAINING_ROUNDS = 10000
+PJME_EARLY_STOPPING = 50
+TRAINING_REPORT_PERIOD = 100
+
+
+class TrainingReport(xgb.callback.TrainingCallback):
+    def __init__(self, nRows: int, period: int = TRAINING_REPORT_PERIOD) -> None:
+        super().__init__()
+        self.nRows = nRows
+        self.period = period
+
+    def before_training(self, model):
+        self.startTime = time.perf_counter()
+        self.periodStartTime = self.startTime
+        # continued training starts from the rounds the booster already has
+        self.startRounds = model.num_boosted_rounds()
+
+        return model
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        if (epoch + 1) % self.period == 0:
+            now = time.perf_counter()
+            periodTime = now - self.periodStartTime
+            self.periodStartTime = now
+
+            print(
+                f'[{epoch + 1}] {now - self.startTime:,.2f}s elapsed, {periodTime / self.period * 1000:,.2f} ms/iteration, '
+                f'{self.nRows * self.period / periodTime / 1e6:,.1f}M rows/s'
+            )
+
+        return False
+
+    def after_training(self, model):
+        trainingTime = time.perf_counter() - self.startTime
+        nIterations = model.num_boosted_rounds() - self.startRounds
+
+        print(
+            f'Training: {nIterations:,} iterations in {trainingTime:,.2f}s, '
+            f'{trainingTime / max(nIterations, 1) * 1000:,.2f} ms/iteration, '
+            f'{self.nRows * nIterations / trainingTime / 1e6:,.1f}M rows/s'
+        )
+
+        return model
+
+
+def getPoolSizes(nTasks: int, nWorkers: int = None, nThreads: int = None):
+    nWorkers = min(nWorkers or os.cpu_count(), max(nTasks, 1))
+    # cores are split between concurrent boosters instead of every booster claiming all of them
+    nThreads = nThreads or max(1, os.cpu_count() // nWorkers)
+
+    return nWorkers, nThreads
+
+
+def getFeatureImportance(booster: xgb.Booster):
+    # normalized gain, the sklearn wrapper's feature_importances_
+    scores = booster.get_score(importance_type='gain')
+    importances = np.array([scores.get(feature, 0.0) for feature in booster.feature_names], dtype=np.float32)
+
+    return importances / importances.sum()
+
+
+def trainSklearnBooster(X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, y_test: pd.Series, nThreads: int = None):
+    regressionModel = xgb.XGBRegressor(
+        n_estimators=PJME_TRAINING_ROUNDS,
+        early_stopping_rounds=PJME_EARLY_STOPPING,
+        learning_rate=0.01,
+        n_jobs=nThreads,
+        callbacks=[TrainingReport(nRows=len(X_train))],
+    )
+    regressionModel.fit(
+        X_train,
+        y_train,
+        eval_set=[(X_train, y_train), (X_test, y_test)],
+        verbose=TRAINING_REPORT_PERIOD)
+
+    return regressionModel.get_booster()[: regressionModel.best_iteration + 1]
+
+
+def trainQuantileBooster(X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, y_test: pd.Series, nThreads: int = None):
+    nThreads = nThreads or os.cpu_count()
+    featureNames = list(X_train.columns)
+
+    # features are quantized once, the test matrix reuses the training bins and the train eval set is the training matrix
+    dtrain = xgb.QuantileDMatrix(
+        X_train.to_numpy(dtype=np.float32), label=y_train.to_numpy(), feature_names=featureNames, nthread=nThreads
+    )
+    dtest = xgb.QuantileDMatrix(
+        X_test.to_numpy(dtype=np.float32), label=y_test.to_numpy(), feature_names=featureNames, ref=dtrain, nthread=nThreads
+    )
+
+    booster = xgb.train(
+        params={**PJME_TRAINING_PARAMS, 'nthread': nThreads},
+        dtrain=dtrain,
+        num_boost_round=PJME_TRAINING_ROUNDS,
+        evals=[(dtrain, 'validation_0'), (dtest, 'validation_1')],
+        early_stopping_rounds=PJME_EARLY_STOPPING,
+        verbose_eval=TRAINING_REPORT_PERIOD,
+        callbacks=[TrainingReport(nRows=dtrain.num_row())],
+    )
+
+    return booster[: booster.best_iteration + 1]
+
+
+def trainPJMEBooster(
+    X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, y_test: pd.Series, trainingMode: str = 'sklearn', nThreads: int = None
+):
+    if trainingMode == 'sklearn':
+        return trainSklearnBooster(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, nThreads=nThreads)
+
+    if trainingMode == 'quantile':
+        return trainQuantileBooster(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, nThreads=nThreads)
+
+    raise ValueError(f'Unknown training mode {trainingMode}. Options: {TRAINING_MODES}')
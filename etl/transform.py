@@ -1,190 +1,218 @@
-import ast
 import re
 
 import numpy as np
 import pandas as pd
-import xgboost as xgb
 
-from etl.extract import getCreditsDb, getMoviesRawDf, getPJMEHourlyRawDf, getDivorceData
+from etl.extract import DATA_PATH, getCreditsDb, getMoviesRawDf, getPJMHourlyRawDf, getDivorceData
+from etl.parsing import TAG_COLUMNS, parseMovieDbTagColumns
+from etl.stemming import TokenStemmer
+from etl.training import getFeatureImportance, trainPJMEBooster
+from common.filters import createFilterIndex
+from common.features import CALENDAR_FEATURES, createCalendarFeatures
+from common.models import predictBooster
+from common.scoring import createLogisticScorer, foldLogisticRegression
 
-from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, confusion_matrix
 
-from nltk.stem.porter import PorterStemmer
+PJM_REGIONS = ['PJME', 'PJMW', 'AEP', 'COMED', 'DAYTON', 'DEOK', 'DOM', 'DUQ', 'EKPC', 'FE', 'NI', 'PJM_Load']
+PJME_FEATURES = list(CALENDAR_FEATURES)
+PJME_TARGET = 'PJME_MW'
+PJME_SPLIT_DATE = '2015-01-01'
+PJM_TEST_SHARE = 0.25
+PJME_BOX_OUTLIERS = 50
 
-def extractAttributeFromStrListObj(obj: str, attrName: str, limit: int = None):
-    if not isinstance(obj, str):
-        return
 
-    objList = ast.literal_eval(obj)
+def appendTags(row: pd.Series):
+    tagList = []
 
-    returnList = []
+    for item in row:
+        tagList.extend(item)
 
-    for idx, objItem in enumerate(objList):
-        if attrName not in objItem:
-            continue
+    return ' '.join(tagList)
 
-        if isinstance(limit, int) and not limit > idx:
-            break
 
-        returnList.append(str(objItem[attrName]).replace(" ", "").lower())
+def createMoviesDatabase(dataPath: str = DATA_PATH):
+    moviesRawDb = getMoviesRawDf(dataPath=dataPath)
 
-    return returnList
+    r = re.compile("^[a-zA-Z0-9]")
+    movieTitles = moviesRawDb['title'].to_list()
+    movieTitles = filter(r.match, movieTitles)
 
+    moviesRawDb = moviesRawDb.loc[moviesRawDb['title'].isin(movieTitles)]
+    moviesRawDb = moviesRawDb.loc[moviesRawDb['vote_count'] > 400]
+    creditsDb = getCreditsDb(dataPath=dataPath, titles=moviesRawDb['title'].unique())
+    cleanMovieDb = moviesRawDb.merge(creditsDb, how='left', on='title')
 
-def getMainCrewMembersFromStrListObj(obj: str, jobs: list = ['Writer', 'Director']):
-    if not isinstance(obj, str):
-        return
+    return cleanMovieDb
 
-    objList = ast.literal_eval(obj)
 
-    returnList = []
+def createAnalyticsMoviesDatabase(
+    movieDb: pd.DataFrame, nWorkers: int = None, stemmer: TokenStemmer = None, parsedDf: pd.DataFrame = None
+):
+    pickedColumns = ['id', 'title', 'genres', 'keywords', 'cast', 'crew']
+    movieDbCp = movieDb.copy()
 
-    for objItem in objList:
-        if len(returnList) == len(jobs):
-            break
+    movieDbCp = movieDbCp[pickedColumns]
 
-        job = objItem['job']
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDbCp, nWorkers=nWorkers) if parsedDf is None else parsedDf
+    movieDbCp[TAG_COLUMNS] = parsedDf[TAG_COLUMNS]
 
-        if job not in jobs:
-            continue
+    movieDbCp['tags'] = movieDbCp[TAG_COLUMNS].apply(lambda row: appendTags(row), axis=1)
 
-        returnList.append(objItem['name'].replace(" ", "").lower())
+    stemmer = stemmer or TokenStemmer()
+    movieDbCp['tags'] = stemmer.stemTexts(texts=movieDbCp['tags'].to_list())
 
-    return returnList
+    return movieDbCp
 
 
-def appendTags(row: pd.Series):
-    tagList = []
+def createMovieCardsDatabase(movieDb: pd.DataFrame, parsedDf: pd.DataFrame = None):
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDb) if parsedDf is None else parsedDf
 
-    for item in row:
-        tagList.extend(item)
+    movieCards = movieDb[['title', 'release_date', 'overview']].copy()
+    movieCards[['release_date', 'overview']] = movieCards[['release_date', 'overview']].fillna('')
 
-    return ' '.join(tagList)
+    movieCards['director'] = parsedDf['director']
+    movieCards['cast'] = parsedDf['cardCast']
+    movieCards['genres'] = parsedDf['genreNames']
 
+    # rows stay aligned with movieDbAnalytics, so neighbor indexes address cards directly
+    movieCards.reset_index(drop=True, inplace=True)
 
-def stem(text, stem):
-    y = []
+    return movieCards
 
-    for word in text.split():
-        y.append(stem(word))
 
-    return " ".join(y)
+def createMovieDbFilterIndex(movieDb: pd.DataFrame, parsedDf: pd.DataFrame = None):
+    parsedDf = parseMovieDbTagColumns(movieDb=movieDb) if parsedDf is None else parsedDf
 
+    genreLists = parsedDf['genreNames'].to_list()
+    years = pd.to_datetime(movieDb['release_date'], errors='coerce').dt.year.to_numpy(dtype=float)
 
-def createMoviesDatabase():
-    creditsDb = getCreditsDb()
-    moviesRawDb = getMoviesRawDf()
+    filterIndex = createFilterIndex(genreLists=genreLists, years=years, voteCounts=movieDb['vote_count'].to_numpy())
 
-    r = re.compile("^[a-zA-Z0-9]")
-    movieTitles = moviesRawDb['title'].to_list()
-    movieTitles = filter(r.match, movieTitles)
+    return filterIndex
 
-    moviesRawDb = moviesRawDb.loc[moviesRawDb['title'].isin(movieTitles)]
-    moviesRawDb = moviesRawDb.loc[moviesRawDb['vote_count'] > 400]
-    cleanMovieDb = moviesRawDb.merge(creditsDb, how='left', on='title')
 
-    return cleanMovieDb
+def getRegionTarget(region: str):
+    # every region file holds one load column named after the region
+    return f'{region}_MW'
 
 
-def createAnalyticsMoviesDatabase(movieDb: pd.DataFrame):
-    pickedColumns = ['title', 'genres', 'keywords', 'cast', 'crew']
-    movieDbCp = movieDb.copy()
+def createPJMEDf(dataPath: str = DATA_PATH, region: str = 'PJME'):
+    pjmeDf = getPJMHourlyRawDf(region=region, dataPath=dataPath)
 
-    movieDbCp = movieDbCp[pickedColumns]
+    #### TRANSFORM ####
+    # timestamps and the float32 load column come typed from the extract schema
+    pjmeDf.rename(columns={'Datetime': 'datetime'}, inplace=True)
+    pjmeDf.set_index(keys=['datetime'], inplace=True)
+    pjmeDf.sort_index(inplace=True)
 
-    movieDbCp.loc[:, 'genres'] = movieDbCp['genres'].apply(
-        lambda x: extractAttributeFromStrListObj(obj=x, attrName='name')
-    )
-    movieDbCp.loc[:, 'keywords'] = movieDbCp['keywords'].apply(
-        lambda x: extractAttributeFromStrListObj(obj=x, attrName='name')
-    )
-    movieDbCp.loc[:, 'cast'] = movieDbCp['cast'].apply(
-        lambda x: extractAttributeFromStrListObj(obj=x, attrName='name', limit=5)
-    )
-    movieDbCp.loc[:, 'crew'] = movieDbCp['crew'].apply(lambda x: getMainCrewMembersFromStrListObj(obj=x))
+    #### FEATURE CREATION ####
+    pjmeDf = pd.concat([pjmeDf, createCalendarFeatures(datetimes=pjmeDf.index, index=pjmeDf.index)], axis=1)
 
-    movieDbCp['tags'] = movieDbCp[['genres', 'keywords', 'cast', 'crew']].apply(lambda row: appendTags(row), axis=1)
+    return pjmeDf
 
-    ps = PorterStemmer()
-    movieDbCp['tags'] = movieDbCp['tags'].apply(lambda x: stem(x, stem=ps.stem))
 
-    return movieDbCp
+def getPJMSplitDate(index: pd.DatetimeIndex):
+    if index[0] < pd.Timestamp(PJME_SPLIT_DATE) < index[-1]:
+        return PJME_SPLIT_DATE
 
+    # regions whose history does not cross the default split hold out their most recent quarter
+    return str(index[int(len(index) * (1 - PJM_TEST_SHARE))].date())
 
-def createMovieDbSimilarityVectors(movieDb: pd.DataFrame):
-    movieDbDist = movieDb[['title', 'tags']].copy()
 
-    cv = CountVectorizer(max_features=10000, stop_words='english')
-    cv.fit_transform(movieDbDist['tags']).toarray().shape
+def createPJMETrainTestDf(pjmeDf: pd.DataFrame = None, splitDate: str = PJME_SPLIT_DATE):
+    pjmeDf = createPJMEDf() if pjmeDf is None else pjmeDf
 
-    vectors = cv.fit_transform(movieDbDist['tags']).toarray()
+    pjmeTrain = pjmeDf.loc[pjmeDf.index < splitDate]
+    pjmeTest = pjmeDf.loc[pjmeDf.index >= splitDate]
 
-    similarityVectors = cosine_similarity(vectors)
+    return pjmeTrain, pjmeTest
+    
+def createPJMEBoxStats(pjmeDf: pd.DataFrame, target: str = PJME_TARGET):
+    boxStatsList = []
+    boxOutliersList = []
 
-    return similarityVectors
+    for feature in PJME_FEATURES:
+        featureDf = pjmeDf[[feature, target]].rename(columns={feature: 'value'})
+        grouped = featureDf.groupby('value')[target]
 
+        boxStats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+        boxStats.columns = ['q1', 'median', 'q3']
 
-def createPJMETrainTestDf():
-    pjmeHourlyRawDf = getPJMEHourlyRawDf()
-    
-    #### TRANSFORM ####
-    pjmeHourlyRawDf.rename(columns={'Datetime': 'datetime'}, inplace=True)
-    pjmeHourlyRawDf['datetime'] = pd.to_datetime(pjmeHourlyRawDf['datetime'])
-    pjmeHourlyRawDf.set_index(keys=['datetime'], inplace=True)
+        # whiskers end at the furthest points within 1.5 IQR, like plotly computes them from raw data
+        iqr = boxStats['q3'] - boxStats['q1']
+        lowerLimit = featureDf['value'].map(boxStats['q1'] - 1.5 * iqr)
+        upperLimit = featureDf['value'].map(boxStats['q3'] + 1.5 * iqr)
+        isInside = featureDf[target].between(lowerLimit, upperLimit)
 
-    #### FEATURE CREATION ####
-    pjmeHourlyRawDf['hour'] = pjmeHourlyRawDf.index.hour
-    pjmeHourlyRawDf['day'] = pjmeHourlyRawDf.index.day
-    pjmeHourlyRawDf['month'] = pjmeHourlyRawDf.index.month
-    pjmeHourlyRawDf['year'] = pjmeHourlyRawDf.index.year
-    pjmeHourlyRawDf['quarter'] = pjmeHourlyRawDf.index.quarter
-    pjmeHourlyRawDf['dayofyear'] = pjmeHourlyRawDf.index.dayofyear
+        insideGrouped = featureDf.loc[isInside].groupby('value')[target]
+        boxStats['lowerfence'] = insideGrouped.min()
+        boxStats['upperfence'] = insideGrouped.max()
+        boxStats['count'] = grouped.size()
 
-    pjmeTrain = pjmeHourlyRawDf.loc[pjmeHourlyRawDf.index < '2015-01-01']
-    pjmeTest = pjmeHourlyRawDf.loc[pjmeHourlyRawDf.index >= '2015-01-01']
+        outliers = featureDf.loc[~isInside]
+        outliers = outliers.groupby('value', group_keys=False).apply(
+            lambda x: x.sample(n=min(len(x), PJME_BOX_OUTLIERS), random_state=0)
+        )
 
-    return pjmeTrain, pjmeTest
-    
-def createXbgRegressionTrainObject():
-    pjmeHourlyRawDf = getPJMEHourlyRawDf()
-    pjmeTrain, pjmeTest = createPJMETrainTestDf()
-    
-    FEATURES = ['hour', 'day', 'month', 'year', 'quarter', 'dayofyear']
-    TARGET = ['PJME_MW']
+        boxStatsList.append(boxStats.reset_index().assign(feature=feature))
+        boxOutliersList.append(outliers.reset_index(drop=True).assign(feature=feature))
 
-    X_train = pjmeTrain[FEATURES]
-    y_train = pjmeTrain[TARGET]
+    boxStatsDf = pd.concat(boxStatsList, ignore_index=True).astype({'value': np.int16})
+    boxOutliersDf = pd.concat(boxOutliersList, ignore_index=True).astype({'value': np.int16})
 
-    X_test = pjmeTest[FEATURES]
-    y_test = pjmeTest[TARGET]
-    
-    regressionModel = xgb.XGBRegressor(n_estimators=10000, early_stopping_rounds=50, learning_rate=0.01)
-    regressionModel.fit(
-        X_train,
-        y_train,
-        eval_set=[(X_train, y_train), (X_test, y_test)],
-        verbose=100)
-    
-    fi = pd.DataFrame(data=regressionModel.feature_names_in_, index=regressionModel.feature_importances_, columns=['importance'])
+    return boxStatsDf, boxOutliersDf
+
+
+def createXbgRegressionObject(pjmeDf: pd.DataFrame, booster, splitDate: str = PJME_SPLIT_DATE, region: str = 'PJME'):
+    target = getRegionTarget(region=region)
+
+    # predictions ship with the data, the page only reads them
+    pjmeDf['prediction'] = predictBooster(booster=booster, features=pjmeDf[PJME_FEATURES].to_numpy())
+
+    fi = pd.DataFrame(data=booster.feature_names, index=getFeatureImportance(booster=booster), columns=['importance'])
     fi.sort_index(inplace=True)
     
+    boxStats, boxOutliers = createPJMEBoxStats(pjmeDf=pjmeDf, target=target)
+
     xbgObject = {
-        'raw': pjmeHourlyRawDf,
-        'X_train': X_train,
-        'y_train': y_train,
-        'X_test': X_test,
-        'y_test': y_test,
-        'model': regressionModel,
-        'featureImportance': fi
+        'region': region,
+        'target': target,
+        'data': pjmeDf,
+        'splitDate': splitDate,
+        'featureImportance': fi,
+        'boxStats': boxStats,
+        'boxOutliers': boxOutliers,
+        'model': booster
     }
     
     return xbgObject
 
+
+def createXbgRegressionTrainObject(
+    trainingMode: str = 'sklearn', nThreads: int = None, region: str = 'PJME', dataPath: str = DATA_PATH
+):
+    target = getRegionTarget(region=region)
+    pjmeDf = createPJMEDf(dataPath=dataPath, region=region)
+    splitDate = getPJMSplitDate(index=pjmeDf.index)
+    pjmeTrain, pjmeTest = createPJMETrainTestDf(pjmeDf=pjmeDf, splitDate=splitDate)
+
+    X_train = pjmeTrain[PJME_FEATURES]
+    y_train = pjmeTrain[target]
+
+    X_test = pjmeTest[PJME_FEATURES]
+    y_test = pjmeTest[target]
+    
+    # the served booster keeps the trees up to the early stopping best iteration only
+    booster = trainPJMEBooster(
+        X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, trainingMode=trainingMode, nThreads=nThreads
+    )
+
+    return createXbgRegressionObject(pjmeDf=pjmeDf, booster=booster, splitDate=splitDate, region=region)
+
 def createDivorceDataModel():
     
     divorceDataDf = getDivorceData()
@@ -217,10 +245,19 @@ def createDivorceDataModel():
 
     logisticRegression = LogisticRegression(random_state=0)
     logisticRegression.fit(X=X_normalized, y=y)
+
+    # the page scores with plain weights, no sklearn needed to serve the model
+    weights, bias = foldLogisticRegression(
+        coefficients=logisticRegression.coef_[0],
+        intercept=logisticRegression.intercept_[0],
+        means=standardScaler.mean_,
+        scales=standardScaler.scale_,
+    )
     
     divorceMlObject = {
         'model': logisticRegression,
-        'scaler': standardScaler
+        'scaler': standardScaler,
+        'scorer': createLogisticScorer(features=mostImportantFeatures, weights=weights, bias=bias)
     }
     
     return divorceMlObject
\ No newline at end of file
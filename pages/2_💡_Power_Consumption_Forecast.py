@@ -1,4 +1,5 @@
 import os
+import json
 import pickle
 
 import streamlit as st
@@ -14,15 +15,28 @@ from urllib.request import urlopen
 from aws.client import createSession
 from aws.s3 import generatePresignedUrl
 from common.constants import IMAGE_ENSEMBLE_EXAMPLE
+from common.downsampling import CHART_POINT_BUDGET, downsampleSeries
+from common.forecast import FORECAST_HORIZONS, createForecast
+from common.models import loadBooster
 
 AWS_BUCKET_PREFIX = 'worked'
 
 AWS_SESSION = createSession()
 
 ######## LOAD DATA ########
-@st.cache_resource(show_spinner=False)
-def getxbgPJMEObj():
-    s3Key = f'{AWS_BUCKET_PREFIX}/xbgPJMEObj.pkl'
+@st.cache_data(ttl=3600, show_spinner=False)
+def getPJMRegions():
+    s3Key = f'{AWS_BUCKET_PREFIX}/pjmRegions.json'
+    url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
+
+    return json.load(urlopen(url))['regions']
+
+
+# one object per region, only downloaded once the region is picked
+# model refreshes republish the object in place, it is picked up on the next hour
+@st.cache_resource(ttl=3600, show_spinner=False)
+def getxbgPJMEObj(region: str):
+    s3Key = f'{AWS_BUCKET_PREFIX}/xbg{region}Obj.pkl'
     url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
 
     xbgPJMEObj = pickle.load(urlopen(url))
@@ -30,53 +44,49 @@ def getxbgPJMEObj():
     return xbgPJMEObj
 
 
-######## FUNCTIONS ########
-@st.cache_data
-def createFeatures(rawDf):
-    pjmeHourlyRawDf = rawDf.copy()
-        
-    pjmeHourlyRawDf.rename(columns={'Datetime': 'datetime'}, inplace=True)
-    pjmeHourlyRawDf['datetime'] = pd.to_datetime(pjmeHourlyRawDf['datetime'])
-    pjmeHourlyRawDf.set_index(keys=['datetime'], inplace=True)
-    pjmeHourlyRawDf.sort_index(inplace=True)
-    
-    pjmeHourlyRawDf['hour'] = pjmeHourlyRawDf.index.hour
-    pjmeHourlyRawDf['day'] = pjmeHourlyRawDf.index.day
-    pjmeHourlyRawDf['month'] = pjmeHourlyRawDf.index.month
-    pjmeHourlyRawDf['year'] = pjmeHourlyRawDf.index.year
-    pjmeHourlyRawDf['quarter'] = pjmeHourlyRawDf.index.quarter
-    pjmeHourlyRawDf['dayofyear'] = pjmeHourlyRawDf.index.dayofyear
-    
-    return pjmeHourlyRawDf
+@st.cache_resource(show_spinner=False)
+def getPJMEBooster(modelFilename: str):
+    # model filenames carry the model version, one booster is shared by every session
+    url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=f'{AWS_BUCKET_PREFIX}/{modelFilename}')
+
+    return loadBooster(modelBytes=urlopen(url).read())
 
-@st.cache_data
-def getPredictions(_model, X_test):
-    predictions = _model.predict(X=X_test)
-    return predictions
 
+######## FUNCTIONS ########
+def addSplitLine(fig: go.Figure, splitDate: str, dateRange: tuple):
+    # shapes count for autorange, a split outside the zoomed range would stretch the axis
+    if dateRange[0] <= pd.Timestamp(splitDate) <= dateRange[1]:
+        fig.add_vline(x=pd.Timestamp(splitDate), line_dash='dash')
+
+# frames are not hashed, charts are keyed on the region, the published model version and the chart window
 @st.cache_data
-def createPjmeRawDataChart(pjmeRawDf):
+def createPjmeRawDataChart(_pjmeRawDf: pd.DataFrame, region: str, modelVersion: str, target: str, dateRange: tuple):
+    powerSeries = downsampleSeries(series=_pjmeRawDf[target], dateRange=dateRange)
     
     fig = go.Figure(data=[
         go.Scatter(
-            x=pjmeRawDf.index,
-            y=pjmeRawDf['PJME_MW']
+            x=powerSeries.index,
+            y=powerSeries
         )
     ])
     
-    fig.update_layout(title="PJM East Cost Power Consumption", yaxis_title='MW')
+    fig.update_layout(title=f"PJM {region} Power Consumption", yaxis_title='MW')
 
     return fig
 
 @st.cache_data
-def createPjmeSplitDataChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
+def createPjmeSplitDataChart(
+    _y_train: pd.DataFrame, _y_test: pd.DataFrame, region: str, modelVersion: str, target: str, splitDate: str, dateRange: tuple
+):
+    trainSeries = downsampleSeries(series=_y_train[target], dateRange=dateRange)
+    testSeries = downsampleSeries(series=_y_test[target], dateRange=dateRange)
     
     fig = go.Figure()
     
     fig.add_trace(
         go.Scatter(
-            x=y_train.index,
-            y=y_train['PJME_MW'],
+            x=trainSeries.index,
+            y=trainSeries,
             name='Train Data',
             marker=dict(color="#475569", size=5)
         )
@@ -84,14 +94,14 @@ def createPjmeSplitDataChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
     
     fig.add_trace(
         go.Scatter(
-            x=y_test.index,
-            y=y_test['PJME_MW'],
+            x=testSeries.index,
+            y=testSeries,
             name='Test Data',
             marker=dict(color="#0284c7", size=5)
         )
     )
     
-    fig.add_vline(x=dt.date(2015, 1, 1), line_dash='dash')
+    addSplitLine(fig=fig, splitDate=splitDate, dateRange=dateRange)
 
     fig.update_layout(
         title="Train/Test Data Split",
@@ -101,10 +111,10 @@ def createPjmeSplitDataChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
     return fig
 
 @st.cache_data
-def createOneWeekData(y_test: pd.DataFrame):
+def createOneWeekData(_y_test: pd.DataFrame, region: str, modelVersion: str, target: str, weekStart: pd.Timestamp):
 
-    oneWeekData = y_test.loc[(y_test.index >= '2018-01-01') & (y_test.index <= '2018-01-07')]
-    fig = px.scatter(oneWeekData, x=oneWeekData.index, y=['PJME_MW'], title='One Week Data')
+    oneWeekData = _y_test.loc[(_y_test.index >= weekStart) & (_y_test.index <= weekStart + pd.Timedelta(days=6))]
+    fig = px.scatter(oneWeekData, x=oneWeekData.index, y=[target], title='One Week Data')
     
     fig.update_layout(
         yaxis_title="MW"
@@ -113,14 +123,19 @@ def createOneWeekData(y_test: pd.DataFrame):
     return fig
 
 @st.cache_data
-def createForecastChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
+def createForecastChart(
+    _y_train: pd.DataFrame, _y_test: pd.DataFrame, region: str, modelVersion: str, target: str, splitDate: str, dateRange: tuple
+):
+    trainSeries = downsampleSeries(series=_y_train[target], dateRange=dateRange)
+    testSeries = downsampleSeries(series=_y_test[target], dateRange=dateRange)
+    predictionSeries = downsampleSeries(series=_y_test['prediction'], dateRange=dateRange)
     
     fig = go.Figure()
 
     fig.add_trace(
             go.Scatter(
-                x=y_train.index,
-                y=y_train['PJME_MW'],
+                x=trainSeries.index,
+                y=trainSeries,
                 name='Train Data',
                 marker=dict(color="#475569", size=5)
             )
@@ -128,8 +143,8 @@ def createForecastChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
 
     fig.add_trace(
             go.Scatter(
-                x=y_test.index,
-                y=y_test['PJME_MW'],
+                x=testSeries.index,
+                y=testSeries,
                 name='Test Data',
                 marker=dict(color="#0284c7", size=5)
             )
@@ -137,14 +152,14 @@ def createForecastChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
 
     fig.add_trace(
             go.Scatter(
-                x=y_test.index,
-                y=y_test['prediction'],
+                x=predictionSeries.index,
+                y=predictionSeries,
                 name='Prediction',
                 marker=dict(color="#fda4af", size=5)
             )
     )
 
-    fig.add_vline(x=dt.date(2015, 1, 1), line_dash='dash')
+    addSplitLine(fig=fig, splitDate=splitDate, dateRange=dateRange)
 
     fig.update_layout(
         title="Forecast",
@@ -154,16 +169,16 @@ def createForecastChart(y_train: pd.DataFrame, y_test: pd.DataFrame):
     return fig
 
 @st.cache_data
-def oneWeekPrediction(y_test: pd.DataFrame):
+def oneWeekPrediction(_y_test: pd.DataFrame, region: str, modelVersion: str, target: str, weekStart: pd.Timestamp):
     
-    oneWeekData = y_test.loc[(y_test.index >= '2018-01-01') & (y_test.index <= '2018-01-07')]
+    oneWeekData = _y_test.loc[(_y_test.index >= weekStart) & (_y_test.index <= weekStart + pd.Timedelta(days=6))]
     
     fig = go.Figure()
     
     fig.add_trace(
         go.Scatter(
             x=oneWeekData.index,
-            y=oneWeekData['PJME_MW'],
+            y=oneWeekData[target],
             name='Test Data',
             mode='markers',
             marker=dict(color='#0284c7', size=5)
@@ -188,6 +203,88 @@ def oneWeekPrediction(y_test: pd.DataFrame):
     
     return fig
     
+@st.cache_data
+def createBoxPlotChart(boxStats: pd.DataFrame, boxOutliers: pd.DataFrame, target: str, feature: str):
+    featureBoxStats = boxStats.loc[boxStats['feature'] == feature]
+    featureOutliers = boxOutliers.loc[boxOutliers['feature'] == feature]
+    colors = px.colors.qualitative.Plotly
+
+    fig = go.Figure()
+
+    # boxes are drawn from precomputed quartiles, outliers from a capped sample per value
+    for idx, row in enumerate(featureBoxStats.itertuples(index=False)):
+        color = colors[idx % len(colors)]
+        valueOutliers = featureOutliers.loc[featureOutliers['value'] == row.value, target]
+
+        fig.add_trace(
+            go.Box(
+                x=[row.value],
+                q1=[row.q1],
+                median=[row.median],
+                q3=[row.q3],
+                lowerfence=[row.lowerfence],
+                upperfence=[row.upperfence],
+                name=str(row.value),
+                legendgroup=str(row.value),
+                marker=dict(color=color)
+            )
+        )
+
+        if len(valueOutliers) > 0:
+            fig.add_trace(
+                go.Scatter(
+                    x=[row.value] * len(valueOutliers),
+                    y=valueOutliers,
+                    mode='markers',
+                    name=str(row.value),
+                    legendgroup=str(row.value),
+                    showlegend=False,
+                    marker=dict(color=color, size=4)
+                )
+            )
+
+    fig.update_layout(xaxis_title=feature, yaxis_title=target, legend_title_text=feature)
+
+    return fig
+
+@st.cache_data(show_spinner=False)
+def getFutureForecast(_booster, modelVersion: str, lastTimestamp: pd.Timestamp, horizonDays: int):
+    return createForecast(booster=_booster, lastTimestamp=lastTimestamp, horizonDays=horizonDays)
+
+@st.cache_data
+def createFutureForecastChart(_pjmeRawDf: pd.DataFrame, _forecast: pd.Series, region: str, modelVersion: str, target: str, horizonDays: int):
+    historySeries = downsampleSeries(
+        series=_pjmeRawDf[target], dateRange=(_forecast.index[0] - (_forecast.index[-1] - _forecast.index[0]), _forecast.index[0])
+    )
+    forecastSeries = downsampleSeries(series=_forecast)
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Scatter(
+            x=historySeries.index,
+            y=historySeries,
+            name='Recent Data',
+            marker=dict(color="#0284c7", size=5)
+        )
+    )
+
+    fig.add_trace(
+        go.Scatter(
+            x=forecastSeries.index,
+            y=forecastSeries,
+            name='Forecast',
+            marker=dict(color="#fda4af", size=5)
+        )
+    )
+
+    fig.update_layout(
+        title="Future Forecast",
+        yaxis_title="MW"
+    )
+
+    return fig
+
 @st.cache_data
 def createFeatureImportanceChart(featureImportance: pd.DataFrame):
     fi = featureImportance.copy()
@@ -198,19 +295,39 @@ def createFeatureImportanceChart(featureImportance: pd.DataFrame):
     return fig
     
 ######## APP ########
-st.header('PJM East Coast Power Consumption Forecast 💡')
+st.header('PJM Power Consumption Forecast 💡')
+
+regions = getPJMRegions()
+region = st.selectbox(label='Region', options=regions, index=regions.index('PJME') if 'PJME' in regions else 0)
 
 with st.spinner('Downloading model and data. Please wait.'):
-    xbgPJMEObj = getxbgPJMEObj()
+    xbgPJMEObj = getxbgPJMEObj(region=region)
 
-pjmeRawDf = createFeatures(xbgPJMEObj['raw'])
+# features and predictions come precomputed, rows are sorted so the split is a positional slice
+pjmeDf = xbgPJMEObj['data']
+target = xbgPJMEObj['target']
+splitDate = xbgPJMEObj['splitDate']
+modelVersion = xbgPJMEObj['modelVersion']
+splitRow = pjmeDf.index.searchsorted(pd.Timestamp(splitDate))
 
-X_train = xbgPJMEObj['X_train'].sort_index()
-y_train = xbgPJMEObj['y_train'].sort_index()
-X_test = xbgPJMEObj['X_test'].sort_index()
-y_test = xbgPJMEObj['y_test'].sort_index()
-model = xbgPJMEObj['model']
+y_train = pjmeDf.iloc[:splitRow]
+y_test = pjmeDf.iloc[splitRow:]
 featureImportance = xbgPJMEObj['featureImportance']
+# first week of the last test year with a full week of data, refreshed models only test on their held out hours
+weekStart = max(
+    pd.Timestamp(year=(pjmeDf.index[-1] - pd.Timedelta(days=7)).year, month=1, day=1), y_test.index[0].normalize()
+)
+
+# hourly charts are downsampled to a point budget, narrowing the range brings back full resolution
+dateRange = st.slider(
+    label='Chart date range',
+    min_value=pjmeDf.index[0].to_pydatetime(),
+    max_value=pjmeDf.index[-1].to_pydatetime(),
+    value=(pjmeDf.index[0].to_pydatetime(), pjmeDf.index[-1].to_pydatetime()),
+    step=dt.timedelta(days=1),
+    format='YYYY-MM-DD',
+)
+st.caption(f'Hourly charts show up to {CHART_POINT_BUDGET:,} points per series, zoom in for full resolution.')
 
 with st.expander(label='', expanded=True):
     st.header("About the Data")
@@ -220,10 +337,10 @@ with st.expander(label='', expanded=True):
 
                 The hourly power consumption data comes from PJM's website and are in megawatts (MW).
 
-                Selected data covers the East Cost regions.
+                Each region is one PJM transmission zone, East Coast (PJME) is shown by default.
                 """)
     
-    st.plotly_chart(figure_or_data=createPjmeRawDataChart(pjmeRawDf=pjmeRawDf), use_container_width=True)
+    st.plotly_chart(figure_or_data=createPjmeRawDataChart(_pjmeRawDf=pjmeDf, region=region, modelVersion=modelVersion, target=target, dateRange=dateRange), use_container_width=True)
 
 
 with st.expander(label='',expanded=True):
@@ -243,9 +360,16 @@ with st.expander(label='',expanded=True):
     st.header("Data Handling")
     
     st.markdown(body="### Train/Test")
-    st.markdown("All records prior to 2015 were used for model training and the remaining data were used for model testing.")
+    refreshReport = xbgPJMEObj.get('refresh', {})
+    if 'trainStart' in refreshReport:
+        st.markdown(
+            f"The served model was refreshed ({refreshReport['mode']}) on the records from {refreshReport['trainStart']} "
+            f"to {splitDate}. The remaining data were held out for model testing."
+        )
+    else:
+        st.markdown(f"All records prior to {splitDate} were used for model training and the remaining data were used for model testing.")
 
-    st.plotly_chart(figure_or_data=createPjmeSplitDataChart(y_test=y_test, y_train=y_train), use_container_width=True)
+    st.plotly_chart(figure_or_data=createPjmeSplitDataChart(_y_test=y_test, _y_train=y_train, region=region, modelVersion=modelVersion, target=target, splitDate=splitDate, dateRange=dateRange), use_container_width=True)
     
     st.markdown(body="### Feature Creation")
     st.markdown("Features created by splicing the datetime feature into hour, day, month, year, quarter and dayofyear.")
@@ -255,19 +379,33 @@ with st.expander(label='',expanded=True):
 
     for idx, feature in enumerate(features):
         with boxPlotTabs[idx]:
-            boxPlot = px.box(pjmeRawDf, x=feature, y='PJME_MW', color=feature)
+            boxPlot = createBoxPlotChart(boxStats=xbgPJMEObj['boxStats'], boxOutliers=xbgPJMEObj['boxOutliers'], target=target, feature=feature)
             st.plotly_chart(figure_or_data=boxPlot, use_container_width=True)
 
     st.markdown(body="### One Week Data")
-    st.plotly_chart(figure_or_data=createOneWeekData(y_test=y_test), use_container_width=True)
+    st.plotly_chart(figure_or_data=createOneWeekData(_y_test=y_test, region=region, modelVersion=modelVersion, target=target, weekStart=weekStart), use_container_width=True)
     
 with st.expander(label='',expanded=True):
     st.header("Forecasting")
     
-    y_test['prediction'] = getPredictions(_model=model, X_test=X_test)
-    
-    st.plotly_chart(figure_or_data=createForecastChart(y_train=y_train, y_test=y_test), use_container_width=True)
-    st.plotly_chart(figure_or_data=oneWeekPrediction(y_test=y_test), use_container_width=True)
+    st.plotly_chart(figure_or_data=createForecastChart(_y_train=y_train, _y_test=y_test, region=region, modelVersion=modelVersion, target=target, splitDate=splitDate, dateRange=dateRange), use_container_width=True)
+    st.plotly_chart(figure_or_data=oneWeekPrediction(_y_test=y_test, region=region, modelVersion=modelVersion, target=target, weekStart=weekStart), use_container_width=True)
+
+    st.markdown(body="### Future Forecast")
+    horizonDays = st.radio(
+        label="Forecast horizon",
+        options=FORECAST_HORIZONS,
+        format_func=lambda horizon: f'Next {horizon} days',
+        horizontal=True,
+    )
+
+    with st.spinner('Forecasting. Please wait.'):
+        booster = getPJMEBooster(modelFilename=xbgPJMEObj['modelFilename'])
+        forecast = getFutureForecast(
+            _booster=booster, modelVersion=modelVersion, lastTimestamp=pjmeDf.index[-1], horizonDays=horizonDays
+        )
+
+    st.plotly_chart(figure_or_data=createFutureForecastChart(_pjmeRawDf=pjmeDf, _forecast=forecast, region=region, modelVersion=modelVersion, target=target, horizonDays=horizonDays), use_container_width=True)
     
 with st.expander(label='',expanded=True):
     st.header("Feature Importance")
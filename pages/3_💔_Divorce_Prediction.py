@@ -1,5 +1,7 @@
-import pickle
+import json
 from urllib.request import urlopen
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
 import streamlit as st
@@ -11,6 +13,7 @@ setPageHeader()
 from aws.client import createSession
 from aws.s3 import generatePresignedUrl
 from common.constants import IMAGE_LOGISTIC_REGRESSION
+from common.scoring import scoreLogistic
 
 AWS_BUCKET_PREFIX = 'worked'
 
@@ -30,30 +33,36 @@ QUESTIONS = [
 ]
 
 INVERSE_RESPONSE_COLS = [0, 3, 6, 9]
+MAX_RESPONSE = 4
+SCORING_CHUNK_ROWS = 100_000
+PROBABILITY_BINS = 20
 ######## LOAD DATA ########
+# folded weights and bias of the logistic regression, scoring them needs no sklearn
 @st.cache_resource(show_spinner=False)
-def getDivorceMlObj():
-    s3Key = f'{AWS_BUCKET_PREFIX}/divorceMlObj.pkl'
+def getDivorceScorer():
+    s3Key = f'{AWS_BUCKET_PREFIX}/divorceScorer.json'
     url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
 
-    divorceMlObj = pickle.load(urlopen(url))
+    divorceScorer = json.load(urlopen(url))
 
-    return divorceMlObj
+    return divorceScorer
 
-DIVORCE_ML_MODEL = getDivorceMlObj()
+DIVORCE_SCORER = getDivorceScorer()
 
 ######## FUNCTIONS ########
+def getProbabilityColor(adjDivorceProb: float):
+    if adjDivorceProb <= 30:
+        return '#a3e635'
+    elif adjDivorceProb > 30 and adjDivorceProb < 50:
+        return '#d1d5db'
+    else:
+        return '#f87171'
+
 @st.cache_data
 def createDivorceGaugeChart(divorceProbability: float):
 
     adjDivorceProb = divorceProbability * 100
-    
-    if adjDivorceProb <= 30:
-        barColor = '#a3e635'
-    elif adjDivorceProb > 30 and adjDivorceProb < 50:
-        barColor = '#d1d5db'
-    else:
-        barColor = '#f87171'
+    barColor = getProbabilityColor(adjDivorceProb=adjDivorceProb)
 
     fig = go.Figure(
         data=[
@@ -88,35 +97,91 @@ def resetPredictionState():
         del st.session_state['makePrediction']
 
 def getDivorceProbability(responseList):
-    model = DIVORCE_ML_MODEL['model']
-    scaler = DIVORCE_ML_MODEL['scaler']
-    
-    scaledResponses = scaler.transform([responseList])
-    print(scaledResponses)
-    predictionsProbability = model.predict_proba(scaledResponses)
+    predictionsProbability = scoreLogistic(logisticScorer=DIVORCE_SCORER, responses=[responseList])
     
-    return predictionsProbability[0][1]
+    return float(predictionsProbability[0])
+
+def getAdjustedResponses(responses: np.ndarray):
+    # inverse questions are flipped a whole column at a time, one row per questionnaire
+    adjResponses = responses.copy()
+    adjResponses[:, INVERSE_RESPONSE_COLS] = MAX_RESPONSE - adjResponses[:, INVERSE_RESPONSE_COLS]
+
+    return adjResponses
 
 def getAdjustedResponseList(responseList):
-    adjResponseList = responseList.copy()
-    
-    for questionNumber in INVERSE_RESPONSE_COLS:
-        questionVl = responseList[questionNumber]
-        
-        if questionVl == 0:
-            adjValue = 4
-        elif questionVl == 1:
-            adjValue = 3
-        elif questionVl == 2:
-            adjValue = 2
-        elif questionVl == 3:
-            adjValue = 1
-        elif questionVl == 4:
-            adjValue = 0
-            
-        adjResponseList[questionNumber] = adjValue
+    return getAdjustedResponses(np.array([responseList]))[0].tolist()
+
+@st.cache_data(show_spinner=False)
+def scoreResponsesFile(_responsesFile, fileId: str):
+    features = DIVORCE_SCORER['features']
+    scoredChunks = []
+
+    # chunks are read as int64 so out of range answers cannot wrap, they are checked then narrowed to int8
+    _responsesFile.seek(0)
+    try:
+        with pd.read_csv(_responsesFile, dtype={feature: np.int64 for feature in features}, chunksize=SCORING_CHUNK_ROWS) as reader:
+            for chunk in reader:
+                missingFeatures = [feature for feature in features if feature not in chunk.columns]
+                if len(missingFeatures) > 0:
+                    raise ValueError(f"Missing columns {', '.join(missingFeatures)}.")
+
+                responses = chunk[features].to_numpy()
+                if ((responses < 0) | (responses > MAX_RESPONSE)).any():
+                    raise ValueError(f'Responses must be between 0 and {MAX_RESPONSE}.')
+
+                responses = responses.astype(np.int8)
+                chunk[features] = responses
+
+                probabilities = scoreLogistic(logisticScorer=DIVORCE_SCORER, responses=getAdjustedResponses(responses))
+                scoredChunks.append(chunk.assign(divorceProbability=probabilities.astype(np.float32)))
+    except OverflowError:
+        raise ValueError(f'Responses must be between 0 and {MAX_RESPONSE}.')
+
+    return pd.concat(scoredChunks, ignore_index=True)
+
+@st.cache_data(show_spinner=False)
+def getScoredResponsesCsv(_scoredDf: pd.DataFrame, fileId: str):
+    return _scoredDf.to_csv(index=False, float_format='%.4f').encode('utf-8')
+
+@st.cache_data(show_spinner=False)
+def createProbabilityHistogramChart(_probabilities: np.ndarray, fileId: str):
+    # bins are counted here, the chart only carries one bar per bin whatever the number of rows
+    counts, edges = np.histogram(_probabilities, bins=PROBABILITY_BINS, range=(0, 1))
+    binCenters = (edges[:-1] + edges[1:]) / 2 * 100
+
+    fig = go.Figure(
+        data=[
+            go.Bar(
+                x=binCenters,
+                y=counts,
+                width=100 / PROBABILITY_BINS,
+                marker=dict(color=[getProbabilityColor(adjDivorceProb=center) for center in binCenters])
+            )
+        ]
+    )
+    fig.add_vline(x=50, line_dash='dash', line_color='#475569')
+    fig.update_layout(title='Divorce Probability Distribution', xaxis_title='Probability (%)', yaxis_title='Responses', bargap=0)
+
+    return fig
 
-    return adjResponseList
+@st.cache_data(show_spinner=False)
+def createResponsesHistogramChart(_scoredDf: pd.DataFrame, fileId: str):
+    responses = _scoredDf[DIVORCE_SCORER['features']].to_numpy()
+
+    # share of each answer per question, counted column by column
+    answerShares = np.stack(
+        [np.bincount(responses[:, idx], minlength=MAX_RESPONSE + 1) for idx in range(responses.shape[1])]
+    ) / max(len(responses), 1)
+
+    fig = go.Figure()
+    for answer in range(MAX_RESPONSE + 1):
+        fig.add_trace(go.Bar(x=DIVORCE_SCORER['features'], y=answerShares[:, answer], name=str(answer)))
+
+    fig.update_layout(
+        title='Answers per Question', yaxis_title='Share of responses', yaxis_tickformat='.0%', barmode='stack', legend_title_text='Answer'
+    )
+
+    return fig
 
 ######## APP ########
 st.header('Divorce Prediction 💔')
@@ -146,6 +211,55 @@ if submitBtn and 'makePrediction' in st.session_state and bool(st.session_state[
         
         st.plotly_chart(figure_or_data=fig, use_container_width=True)
 
+with st.expander(label='Bulk Scoring', expanded=False):
+    st.header('Score a CSV of questionnaires')
+    st.markdown('One row per questionnaire, one column per question with the same 0~4 answers as the form above. Other columns are kept in the results.')
+
+    questionsDf = pd.DataFrame({'column': DIVORCE_SCORER['features'], 'question': QUESTIONS})
+    st.dataframe(questionsDf, hide_index=True, use_container_width=True)
+    st.download_button(
+        label='Download template',
+        data=','.join(DIVORCE_SCORER['features']) + '\n',
+        file_name='divorce_responses_template.csv',
+        mime='text/csv',
+    )
+
+    responsesFile = st.file_uploader(label='Responses CSV', type=['csv'])
+
+    if responsesFile is not None:
+        try:
+            with st.spinner('Scoring responses. Please wait.'):
+                scoredDf = scoreResponsesFile(_responsesFile=responsesFile, fileId=responsesFile.file_id)
+        except ValueError as error:
+            st.error(f'Could not score {responsesFile.name}: {error}')
+            scoredDf = None
+
+        if scoredDf is not None and len(scoredDf) == 0:
+            st.warning(f'{responsesFile.name} is empty, it holds no questionnaire to score.')
+        elif scoredDf is not None:
+            probabilities = scoredDf['divorceProbability'].to_numpy()
+
+            metricCols = st.columns(3)
+            metricCols[0].metric(label='Questionnaires', value=f'{len(scoredDf):,}')
+            metricCols[1].metric(label='Predicted divorce', value=f'{np.mean(probabilities >= 0.5):.1%}')
+            metricCols[2].metric(label='Mean probability', value=f'{np.mean(probabilities):.1%}')
+
+            st.plotly_chart(
+                figure_or_data=createProbabilityHistogramChart(_probabilities=probabilities, fileId=responsesFile.file_id),
+                use_container_width=True,
+            )
+            st.plotly_chart(
+                figure_or_data=createResponsesHistogramChart(_scoredDf=scoredDf, fileId=responsesFile.file_id),
+                use_container_width=True,
+            )
+
+            st.download_button(
+                label='Download results',
+                data=getScoredResponsesCsv(_scoredDf=scoredDf, fileId=responsesFile.file_id),
+                file_name=f'{responsesFile.name.rsplit(".", 1)[0]}_scored.csv',
+                mime='text/csv',
+            )
+
 with st.expander(label='Methodology', expanded=False):
     st.header('Methodology')
     
@@ -1,16 +1,30 @@
-import pickle
-import ast
+import json
+from io import BytesIO
 
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 
 import streamlit as st
 from common.functions import setPageHeader
 setPageHeader()
 
-from common.states import fullStateReset
+from common.states import stateReset
 from common.styles import secondaryBackgroundColor
 from common.constants import IMAGE_COSINE_SIMILARITY
+from common.artifacts import readParquet
+from common.engines import MOVIE_ENGINES, ExactEngine, IvfEngine, applyTagVectorsDelta, applyIvfAssignmentsDelta
+from common.filters import YEAR_BUCKET_SIZE, createFilterMask, applyFilterIndexDelta
+from common.search import searchTitles
+from common.recommender import (
+    createTitleIndex,
+    getTitleRow,
+    getNeighborRecommendations,
+    getEngineRecommendations,
+    applyNeighborIndexDelta,
+    applyMovieCardsDelta,
+)
+from common.seeds import getSeedRows, createNeighborMatrix, getCentroidRecommendations, getWeightedRecommendations
 from urllib.request import urlopen
 from aws.client import createSession
 from aws.s3 import generatePresignedUrl
@@ -20,97 +34,187 @@ AWS_BUCKET_PREFIX = 'worked'
 
 AWS_SESSION = createSession()
 
+MOVIE_ENGINE_LABELS = {
+    'exact': 'Exact (precomputed neighbors)',
+    'ivf': 'Approximate (IVF index)',
+}
+# neighbors precomputed by an etl run with --neighbor-engine ivf are only approximate
+PRECOMPUTED_IVF_LABEL = 'Precomputed neighbors (IVF index)'
+MOVIE_CARD_COLUMNS = ['title', 'release_date', 'overview', 'director', 'cast', 'genres']
+RECOMMENDATION_STATE_KEYS = ['recommendationMoviesIndexes']
+
 
 ######## LOAD DATA ########
-@st.cache_resource(show_spinner=False)
-def getSimilarityVectors():
-    s3Key = f'{AWS_BUCKET_PREFIX}/similarityVectors.pkl'
+def readS3Npz(s3Key: str):
     url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
 
-    similarityVectors = pickle.load(urlopen(url))
+    with np.load(BytesIO(urlopen(url).read())) as npzFile:
+        arrays = {key: npzFile[key] for key in npzFile.files}
 
-    return similarityVectors
+    return arrays
 
 
-@st.cache_resource(show_spinner=False)
-def getMovieDb():
-    s3Key = f'{AWS_BUCKET_PREFIX}/movieDb.csv'
+def readS3Parquet(s3Key: str, columns: list = None):
     url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
-    movieDb = pd.read_csv(url)
 
-    return movieDb
+    return readParquet(source=BytesIO(urlopen(url).read()), columns=columns)
 
 
-@st.cache_resource(show_spinner=False)
-def getMovieDbAnalytics():
-    s3Key = f'{AWS_BUCKET_PREFIX}/movieDbAnalytics.csv'
+# catalogs are cached by manifest version, one catalog is kept in memory and replaced on the next version
+@st.cache_data(ttl=3600, show_spinner=False)
+def getMovieCatalogManifest():
+    s3Key = f'{AWS_BUCKET_PREFIX}/movieCatalogManifest.json'
     url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=s3Key)
-    movieDbAnalytics = pd.read_csv(url)
 
-    return movieDbAnalytics
+    manifest = json.load(urlopen(url))
 
+    return manifest
 
-######## FUNC ########
-@st.cache_resource
-def getMovieTitles(movieDb: pd.DataFrame):
-    titlesList = movieDb['title'].drop_duplicates().to_list()
-    titlesList.sort()
 
-    return titlesList
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getNeighborIndex(_manifest: dict, catalogVersion: int):
+    neighborIndex = readS3Npz(s3Key=f'{AWS_BUCKET_PREFIX}/movieNeighborIndex.npz')
 
+    # incremental catalog updates are published as deltas over the last full ETL
+    for delta in _manifest['deltas']:
+        neighborIndexDelta = readS3Npz(s3Key=f"{AWS_BUCKET_PREFIX}/{delta['neighborIndex']}")
+        neighborIndex = applyNeighborIndexDelta(neighborIndex=neighborIndex, neighborIndexDelta=neighborIndexDelta)
 
-def getRecommendations(title: str, similarityVectors: np.ndarray, movieDb: pd.DataFrame, nRecommendations: int = 10):
-    movieIndex = movieDb.loc[movieDb['title'] == title].index[0]
-    distances = similarityVectors[movieIndex]
-    similarMoviesDf = (
-        pd.DataFrame(distances, columns=['cosin_similarity'])
-        .sort_values(by=['cosin_similarity'], ascending=False)
-        .iloc[1:nRecommendations, :]
-    ).index
+    return neighborIndex
 
-    st.session_state['recommendationMoviesIndexes'] = list(similarMoviesDf)
 
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getNeighborMatrix(_manifest: dict, catalogVersion: int):
+    neighborMatrix = createNeighborMatrix(neighborIndex=getNeighborIndex(_manifest=_manifest, catalogVersion=catalogVersion))
 
-def getMovieDirector(crewListStr: str):
-    crewList = ast.literal_eval(crewListStr)
+    return neighborMatrix
 
-    if not bool(crewList) or len(crewList) == 0:
-        return ''
 
-    for item in crewList:
-        if item['job'] == 'Director':
-            return item['name']
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getMovieCards(_manifest: dict, catalogVersion: int):
+    movieCards = readS3Parquet(s3Key=f'{AWS_BUCKET_PREFIX}/movieCards.parquet', columns=MOVIE_CARD_COLUMNS)
 
+    for delta in _manifest['deltas']:
+        movieCardsDelta = readS3Parquet(
+            s3Key=f"{AWS_BUCKET_PREFIX}/{delta['movieCards']}", columns=[*MOVIE_CARD_COLUMNS, 'row']
+        )
+        movieCards = applyMovieCardsDelta(movieCards=movieCards, movieCardsDelta=movieCardsDelta)
 
-def getMovieCast(castListStr: str):
-    fullCastList = ast.literal_eval(castListStr)
+    return movieCards
 
-    if not bool(fullCastList) or len(fullCastList) == 0:
-        return ''
 
-    summarizedCastList = []
-    for idx, item in enumerate(fullCastList):
-        summarizedCastList.append(item["name"])
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getFilterIndex(_manifest: dict, catalogVersion: int):
+    filterIndex = readS3Npz(s3Key=f'{AWS_BUCKET_PREFIX}/movieFilterIndex.npz')
 
-        if idx >= 5:
-            break
+    for delta in _manifest['deltas']:
+        filterIndexDelta = readS3Npz(s3Key=f"{AWS_BUCKET_PREFIX}/{delta['filterIndex']}")
+        filterIndex = applyFilterIndexDelta(filterIndex=filterIndex, filterIndexDelta=filterIndexDelta)
 
-    return summarizedCastList
+    return filterIndex
 
 
-def getGenresList(genreListStr: str):
-    genresFullList = ast.literal_eval(genreListStr)
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getTitleSearchIndex(_manifest: dict, catalogVersion: int):
+    # updates republish the whole search index, only the latest one is needed
+    titleSearchIndexFilename = 'movieTitleSearchIndex.npz'
+    for delta in _manifest['deltas']:
+        titleSearchIndexFilename = delta['titleSearch']
+
+    return readS3Npz(s3Key=f'{AWS_BUCKET_PREFIX}/{titleSearchIndexFilename}')
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getTagVectors(_manifest: dict, catalogVersion: int):
+    url = generatePresignedUrl(awsSession=AWS_SESSION, s3Key=f'{AWS_BUCKET_PREFIX}/movieTagVectors.npz')
+    tagVectors = sp.load_npz(BytesIO(urlopen(url).read()))
+
+    ivfIndex = readS3Npz(s3Key=f'{AWS_BUCKET_PREFIX}/movieIvfIndex.npz')
+    assignments = ivfIndex['assignments']
+
+    for delta in _manifest['deltas']:
+        tagVectorsDelta = readS3Npz(s3Key=f"{AWS_BUCKET_PREFIX}/{delta['tagVectors']}")
+        tagVectors = applyTagVectorsDelta(vectors=tagVectors, tagVectorsDelta=tagVectorsDelta)
+        assignments = applyIvfAssignmentsDelta(assignments=assignments, tagVectorsDelta=tagVectorsDelta)
+
+    return tagVectors, {'centroids': ivfIndex['centroids'], 'assignments': assignments}
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getIvfEngine(_manifest: dict, catalogVersion: int):
+    tagVectors, ivfIndex = getTagVectors(_manifest=_manifest, catalogVersion=catalogVersion)
+    ivfEngine = IvfEngine(vectors=tagVectors, centroids=ivfIndex['centroids'], assignments=ivfIndex['assignments'])
+
+    return ivfEngine
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def getExactEngine(_manifest: dict, catalogVersion: int):
+    tagVectors, _ = getTagVectors(_manifest=_manifest, catalogVersion=catalogVersion)
+
+    return ExactEngine(vectors=tagVectors)
+
+
+######## FUNC ########
+def getMovieEngineLabel(engine: str, neighborEngine: str):
+    if engine == 'exact' and neighborEngine == 'ivf':
+        return PRECOMPUTED_IVF_LABEL
+
+    return MOVIE_ENGINE_LABELS[engine]
 
-    if not bool(genresFullList) or len(genresFullList) == 0:
-        return ''
 
-    genresList = [genreObj['name'] for genreObj in genresFullList]
+@st.cache_resource(max_entries=1)
+def getTitleIndex(_movieDb: pd.DataFrame, catalogVersion: int):
+    titleIndex = createTitleIndex(titles=_movieDb['title'].to_list())
 
-    return genresList
+    return titleIndex
+
+
+def getRecommendations(
+    title: str,
+    neighborIndex: dict,
+    neighborMatrix: sp.csr_matrix,
+    titleIndex: dict,
+    engine=None,
+    filterMask: np.ndarray = None,
+    extraTitles: list = [],
+    nRecommendations: int = 9,
+):
+    movieRow = getTitleRow(titleIndex=titleIndex, title=title)
+
+    if len(extraTitles) > 0:
+        # watch lists combine their seeds, by vector centroid when vectors are loaded
+        seedRows = getSeedRows(titleIndex=titleIndex, seedTitles=[title, *extraTitles])
+
+        if engine is None:
+            resultIndexes, _ = getWeightedRecommendations(
+                seedLists=[seedRows], neighborMatrix=neighborMatrix, n=nRecommendations
+            )
+        else:
+            resultIndexes, _ = getCentroidRecommendations(
+                seedLists=[seedRows], engine=engine, n=nRecommendations, mask=filterMask
+            )
+
+        similarMoviesIndexes = resultIndexes[0][resultIndexes[0] >= 0]
+    elif engine is None:
+        similarMoviesIndexes, _ = getNeighborRecommendations(
+            movieRow=movieRow, neighborIndex=neighborIndex, n=nRecommendations
+        )
+    else:
+        similarMoviesIndexes, _ = getEngineRecommendations(
+            movieRow=movieRow, engine=engine, n=nRecommendations, mask=filterMask
+        )
+
+    st.session_state['recommendationMoviesIndexes'] = similarMoviesIndexes.tolist()
+
+
+def setLikedTitles():
+    st.session_state['likedTitles'] = st.session_state['likedTitlesSelect']
+    stateReset(keys=RECOMMENDATION_STATE_KEYS)
 
 
 def createGenreTags(tags: list):
-    if not bool(tags) or len(tags) == 0:
+    if tags is None or len(tags) == 0:
         return ''
 
     genreTags = f"""<div style="width: 100%; display: flex; align-items: center; gap: 8px;">{''.join([f'<span style="border: 1px solid {secondaryBackgroundColor}; border-radius: 4px; padding: 8px; font-size: 18px;">{tag}</span>' for tag in tags])}</div>"""
@@ -125,7 +229,7 @@ def createMovieCard(title: str, releaseDate: str, director: str, cast: list, ove
                 <span style="font-size: 40px; font-weight: 600;">{title}<span>
                 {f"<p>Released on: {releaseDate}</p>" if bool(releaseDate) else ""}
                 {f"<p>Director: {director}</p>" if bool(director) else ""}
-                {f"<p>Cast: {', '.join(cast)}</p>" if bool(cast) else ""}
+                {f"<p>Cast: {', '.join(cast)}</p>" if cast is not None and len(cast) > 0 else ""}
                 {f"<p>{overview}</p>" if bool(overview) else ""}
                 {createGenreTags(genres)}
                 </div>""",
@@ -137,42 +241,126 @@ def createMovieCard(title: str, releaseDate: str, director: str, cast: list, ove
 st.header("Movie Recommendation 🎥")
 
 with st.spinner('Downloading model and data. Please wait.'):
-    similarityVectors = getSimilarityVectors()
-    movieDb = getMovieDb()
-    movieDbAnalytics = getMovieDbAnalytics()
+    manifest = getMovieCatalogManifest()
+    neighborIndex = getNeighborIndex(_manifest=manifest, catalogVersion=manifest['version'])
+    neighborMatrix = getNeighborMatrix(_manifest=manifest, catalogVersion=manifest['version'])
+    movieCards = getMovieCards(_manifest=manifest, catalogVersion=manifest['version'])
+    filterIndex = getFilterIndex(_manifest=manifest, catalogVersion=manifest['version'])
+    titleSearchIndex = getTitleSearchIndex(_manifest=manifest, catalogVersion=manifest['version'])
 
-    movieTitles = getMovieTitles(movieDb=movieDb)
+    titleIndex = getTitleIndex(_movieDb=movieCards, catalogVersion=manifest['version'])
 
 with st.expander(label='', expanded=True):
     st.header("Please select a movie")
 
-    title = st.selectbox(label="Movie Titles", options=movieTitles, label_visibility='visible', on_change=fullStateReset)
+    # only the best matches of the search reach the browser, ranked by votes
+    titleQuery = st.text_input(
+        label="Search a movie title",
+        on_change=stateReset,
+        kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+    )
+    movieTitles = searchTitles(titleSearchIndex=titleSearchIndex, query=titleQuery)
+
+    if len(movieTitles) == 0:
+        st.warning(f'No movie title matches "{titleQuery}".')
+        st.stop()
+
+    title = st.selectbox(
+        label="Movie Titles",
+        options=movieTitles,
+        label_visibility='visible',
+        on_change=stateReset,
+        kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+    )
+
+    if len(titleIndex[title]) > 1:
+        st.caption(f'{len(titleIndex[title])} movies share this title, recommendations are based on the first one.')
+
+    # picked titles stay in the options while the search moves on
+    likedTitles = st.session_state.get('likedTitles', [])
+    likedQuery = st.text_input(label="Search more movies you liked (optional)")
+    likedMatches = searchTitles(titleSearchIndex=titleSearchIndex, query=likedQuery)
+
+    extraTitles = st.multiselect(
+        label="More movies you liked (optional)",
+        options=[*likedTitles, *[match for match in likedMatches if match not in likedTitles]],
+        default=likedTitles,
+        key='likedTitlesSelect',
+        on_change=setLikedTitles,
+    )
+
+    movieEngine = st.radio(
+        label="Similarity engine",
+        options=MOVIE_ENGINES,
+        format_func=lambda engine: getMovieEngineLabel(engine=engine, neighborEngine=manifest.get('neighborEngine', 'exact')),
+        horizontal=True,
+        on_change=stateReset,
+        kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+    )
+
+    filterCols = st.columns(3)
+    with filterCols[0]:
+        filterGenres = st.multiselect(
+            label="Genres",
+            options=filterIndex['genreNames'].tolist(),
+            on_change=stateReset,
+            kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+        )
+    with filterCols[1]:
+        yearOptions = [*filterIndex['yearBuckets'].tolist(), int(filterIndex['yearBuckets'][-1]) + YEAR_BUCKET_SIZE]
+        filterYears = st.select_slider(
+            label="Release years",
+            options=yearOptions,
+            value=(yearOptions[0], yearOptions[-1]),
+            on_change=stateReset,
+            kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+        )
+    with filterCols[2]:
+        filterVotes = st.select_slider(
+            label="More votes than",
+            options=filterIndex['voteTiers'].tolist(),
+            on_change=stateReset,
+            kwargs={'keys': RECOMMENDATION_STATE_KEYS},
+        )
+
+    filterMask = createFilterMask(
+        filterIndex=filterIndex,
+        genres=filterGenres,
+        yearRange=None if filterYears == (yearOptions[0], yearOptions[-1]) else filterYears,
+        minVotes=None if filterVotes == 0 else filterVotes,
+    )
+
+    # precomputed neighbors only hold the top matches, filtered queries score the whole catalog
+    if movieEngine == 'ivf':
+        with st.spinner('Downloading approximate index. Please wait.'):
+            engine = getIvfEngine(_manifest=manifest, catalogVersion=manifest['version'])
+    elif filterMask is not None:
+        with st.spinner('Downloading movie vectors. Please wait.'):
+            engine = getExactEngine(_manifest=manifest, catalogVersion=manifest['version'])
+    else:
+        engine = None
 
     st.button(
         "Submit",
         on_click=getRecommendations,
         kwargs={
             'title': title,
-            'similarityVectors': similarityVectors,
-            'movieDb': movieDbAnalytics,
+            'neighborIndex': neighborIndex,
+            'neighborMatrix': neighborMatrix,
+            'titleIndex': titleIndex,
+            'engine': engine,
+            'filterMask': filterMask,
+            'extraTitles': [extraTitle for extraTitle in extraTitles if extraTitle != title],
         },
     )
 
 
 if 'recommendationMoviesIndexes' in st.session_state:
-    recommendationMoviesDf = movieDb.iloc[st.session_state['recommendationMoviesIndexes'], :]
-
-    for idx, row in recommendationMoviesDf.iterrows():
-        title = row['title']
-        genres = getGenresList(row['genres'])
-        releaseDate = row['release_date'] if bool(row['release_date']) else ''
-        overview = row['overview'] if bool(row['overview']) else ''
-
-        director = getMovieDirector(crewListStr=row['crew'])
-        cast = getMovieCast(castListStr=row['cast'])
+    recommendationMoviesDf = movieCards.iloc[st.session_state['recommendationMoviesIndexes'], :]
 
-        with st.expander(label=title, expanded=False):
-            createMovieCard(title, releaseDate, director, cast, overview, genres)
+    for row in recommendationMoviesDf.itertuples(index=False):
+        with st.expander(label=row.title, expanded=False):
+            createMovieCard(row.title, row.release_date, row.director, row.cast, row.overview, row.genres)
 
 with st.expander(label='Methodology'):
     st.header("Methodology")